@@ -1,7 +1,7 @@
 import os
 from flask import Flask
 from .config import Config
-from .extensions import mongo, csrf
+from .extensions import mongo, csrf, audit, compress, jobs, analytics_db, live, repeats
 from .auth.routes import auth_bp
 from .tickets.routes import tickets_bp
 from .admin.routes import admin_bp
@@ -13,6 +13,12 @@ def create_app():
 
     mongo.init_app(app)
     csrf.init_app(app)
+    audit.init_app(app, mongo)
+    compress.init_app(app)
+    jobs.init_app(app, mongo)
+    analytics_db.init_app(app)
+    live.init_app(app, mongo)
+    repeats.init_app(app, mongo)
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(tickets_bp, url_prefix="/tickets")
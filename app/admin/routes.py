@@ -2,7 +2,17 @@
 from flask import Blueprint, current_app, render_template, request, jsonify, session, redirect, abort
 from functools import wraps
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import csv
+import time
+import uuid
 from ..extensions import mongo
+from ..utils.http import bump_data_version
+from ..tickets.stores import invalidate as invalidate_stores
+from ..analytics.live import publish_resync
+from ..analytics.catalog import catalog_add, catalog_add_values
 
 admin_bp = Blueprint("admin", __name__, template_folder="../templates", url_prefix="/_admin")
 
@@ -82,6 +92,10 @@ def api_magasins_add():
     if not doc["Magasin"]:
         return jsonify({"error": "Magasin requis"}), 400
     coll("magasins").insert_one(doc)
+    bump_data_version(_db())
+    catalog_add(_db(), {"bu": doc["BU"]})
+    invalidate_stores()
+    publish_resync()  # BU des magasins: les dashboards recalculent
     return jsonify({"ok": True})
 
 @admin_bp.put("/api/magasins/<oid>")
@@ -94,6 +108,10 @@ def api_magasins_update(oid):
         return jsonify({"error": "bad id"}), 400
     updates = {f: (data.get(f) or "").strip() for f in MAG_FIELDS if f in data}
     coll("magasins").update_one({"_id": _id}, {"$set": updates})
+    bump_data_version(_db())
+    catalog_add(_db(), {"bu": updates.get("BU")})
+    invalidate_stores()
+    publish_resync()
     return jsonify({"ok": True})
 
 @admin_bp.delete("/api/magasins/<oid>")
@@ -104,6 +122,9 @@ def api_magasins_delete(oid):
     except:
         return jsonify({"error": "bad id"}), 400
     coll("magasins").delete_one({"_id": _id})
+    bump_data_version(_db())
+    invalidate_stores()
+    publish_resync()
     return jsonify({"ok": True})
 
 # ================== THÉMATIQUES ==================
@@ -149,6 +170,197 @@ def api_them_delete(oid):
     coll("thematiques").delete_one({"_id": _id})
     return jsonify({"ok": True})
 
+# ================== RECHARGEMENT CSV (magasins / thématiques) ==================
+# cible -> (colonnes attendues, colonne obligatoire)
+RELOAD_TARGETS = {
+    "magasins": (MAG_FIELDS, "Magasin"),
+    "thematiques": (THEM_FIELDS, "Thematique"),
+}
+RELOAD_BATCH_SIZE = 1000
+RELOAD_MAX_ERRORS = 20
+RELOAD_MAX_ROWS = 100000
+
+@admin_bp.errorhandler(413)
+def _too_large(e):
+    mb = (current_app.config.get("MAX_CONTENT_LENGTH") or 0) // (1024 * 1024)
+    return jsonify({"error": f"fichier trop volumineux (maximum {mb} Mo)"}), 413
+
+def _decoded_lines(stream):
+    """Itère le fichier uploadé ligne par ligne (utf-8, repli latin-1 comme l'export Excel)."""
+    for raw in stream:
+        try:
+            yield raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            yield raw.decode("ISO-8859-1")
+
+def _staging_indexes(target, staging):
+    """Recrée sur la collection de staging les index de la collection cible."""
+    for name, spec in coll(target).index_information().items():
+        if name == "_id_":
+            continue
+        opts = {k: v for k, v in spec.items() if k not in ("key", "v", "ns")}
+        coll(staging).create_index(spec["key"], name=name, **opts)
+
+@admin_bp.post("/api/reload/<target>")
+@admin_required
+def api_reload(target):
+    """
+    Remplace magasins ou thematiques depuis un CSV ';' sans fenêtre vide:
+    parse en flux -> insert_many par lots dans <target>__staging_<uuid> -> renameCollection.
+    Une collection de staging par rechargement: deux rechargements simultanés ne se
+    mélangent pas (le dernier renommé gagne). Taille limitée par MAX_CONTENT_LENGTH,
+    nombre de lignes par RELOAD_MAX_ROWS.
+    """
+    if target not in RELOAD_TARGETS:
+        abort(404)
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify({"error": "fichier requis"}), 400
+
+    fields, required = RELOAD_TARGETS[target]
+    staging = f"{target}__staging_{uuid.uuid4().hex[:12]}"
+    t0 = time.perf_counter()
+
+    reader = csv.reader(_decoded_lines(upload.stream), delimiter=";", quotechar='"')
+    header = next(reader, None)
+    if not header:
+        return jsonify({"error": "fichier vide"}), 400
+    # colonnes comparées sans espaces superflus ("Sous catégorie " dans THEM_FIELDS)
+    by_name = {f.strip().lower(): f for f in fields}
+    cols = [by_name.get(h.strip().lower()) for h in header]
+    missing = [f for f in fields if f not in cols]
+    if missing:
+        return jsonify({"error": "colonnes manquantes", "missing": missing}), 400
+
+    stats = {"rows": 0, "inserted": 0, "skipped": 0}
+    errors, batch = [], []
+    for line_no, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        stats["rows"] += 1
+        if stats["rows"] > RELOAD_MAX_ROWS:
+            coll(staging).drop()
+            return jsonify({"error": f"maximum {RELOAD_MAX_ROWS} lignes par fichier"}), 400
+        if len(values) != len(header):
+            stats["skipped"] += 1
+            if len(errors) < RELOAD_MAX_ERRORS:
+                errors.append({"line": line_no, "error": f"{len(values)} colonnes au lieu de {len(header)}"})
+            continue
+        doc = {c: v.strip() for c, v in zip(cols, values) if c}
+        if not doc[required]:
+            stats["skipped"] += 1
+            if len(errors) < RELOAD_MAX_ERRORS:
+                errors.append({"line": line_no, "error": f"{required} vide"})
+            continue
+        batch.append(doc)
+        if len(batch) >= RELOAD_BATCH_SIZE:
+            stats["inserted"] += len(coll(staging).insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+    if batch:
+        stats["inserted"] += len(coll(staging).insert_many(batch, ordered=False).inserted_ids)
+
+    if not stats["inserted"]:
+        coll(staging).drop()
+        return jsonify({"error": "aucune ligne valide", "stats": stats, "errors": errors}), 400
+
+    t1 = time.perf_counter()
+    _staging_indexes(target, staging)
+    db_name = current_app.config["MONGO_DBNAME"]
+    mongo.cx.admin.command("renameCollection", f"{db_name}.{staging}",
+                           to=f"{db_name}.{target}", dropTarget=True)
+    if target == "magasins":  # BU lookup des analytics
+        bump_data_version(_db())
+        catalog_add_values(_db(), "bu", coll("magasins").distinct("BU"))
+        invalidate_stores()
+        publish_resync()
+    t2 = time.perf_counter()
+
+    return jsonify({
+        "ok": True,
+        "target": target,
+        "stats": stats,
+        "errors": errors,
+        "timing_ms": {
+            "load": round((t1 - t0) * 1000, 1),
+            "swap": round((t2 - t1) * 1000, 1),
+            "total": round((t2 - t0) * 1000, 1),
+        },
+    })
+
+# ================== ÉDITIONS GROUPÉES (grilles magasins / thématiques) ==================
+PATCH_MAX_CHANGES = 1000
+
+@admin_bp.patch("/api/<target>")
+@admin_required
+def api_batch_update(target):
+    """
+    Plusieurs cellules modifiées en une requête.
+    Body: {"changes": [{"_id": "...", "fields": {"Ville": "...", ...}}, ...]}
+    Un seul bulk_write ordonné; résultat ligne par ligne (ok / erreur). Si une
+    écriture échoue (ex. doublon sur un index unique), les lignes suivantes ne
+    sont pas appliquées et sont signalées avec retry=true.
+    """
+    if target not in RELOAD_TARGETS:
+        abort(404)
+    fields, required = RELOAD_TARGETS[target]
+    changes = (request.get_json(silent=True) or {}).get("changes")
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"error": "changes requis"}), 400
+    if len(changes) > PATCH_MAX_CHANGES:
+        return jsonify({"error": f"maximum {PATCH_MAX_CHANGES} modifications par requête"}), 400
+
+    results, valid = [], []
+    for i, ch in enumerate(changes):
+        ch = ch if isinstance(ch, dict) else {}
+        res = {"index": i, "_id": ch.get("_id"), "status": "error"}
+        results.append(res)
+        try:
+            _id = ObjectId(ch.get("_id"))
+        except (InvalidId, TypeError):
+            res["error"] = "bad id"
+            continue
+        data = ch.get("fields") if isinstance(ch.get("fields"), dict) else {}
+        unknown = [f for f in data if f not in fields]
+        updates = {f: str(data[f] or "").strip() for f in fields if f in data}
+        if unknown:
+            res["error"] = "champs inconnus: " + ", ".join(unknown)
+        elif not updates:
+            res["error"] = "aucun champ"
+        elif required in updates and not updates[required]:
+            res["error"] = f"{required} requis"
+        else:
+            valid.append((res, _id, updates))
+
+    # une lecture: lignes encore présentes
+    found = {d["_id"] for d in coll(target).find({"_id": {"$in": [v[1] for v in valid]}}, {"_id": 1})}
+    ops, sent = [], []
+    for res, _id, updates in valid:
+        if _id in found:
+            sent.append(res)
+            ops.append(UpdateOne({"_id": _id}, {"$set": updates}))
+        else:
+            res["error"] = "introuvable"
+
+    applied = len(ops)
+    try:
+        modified = coll(target).bulk_write(ops, ordered=True).modified_count if ops else 0
+    except BulkWriteError as e:
+        # ordonné: tout ce qui précède l'erreur est écrit, rien après
+        err = e.details["writeErrors"][0]
+        applied, modified = err["index"], e.details.get("nModified", 0)
+        sent[applied]["error"] = "doublon" if err.get("code") == 11000 else err.get("errmsg", "erreur d'écriture")
+        for res in sent[applied + 1:]:
+            res.update(error="non appliqué", retry=True)
+    for res in sent[:applied]:
+        res["status"] = "ok"
+    if modified and target == "magasins":
+        bump_data_version(_db())
+        catalog_add_values(_db(), "bu", [u.get("BU") for _, _, u in valid])
+        invalidate_stores()
+        publish_resync()
+
+    return jsonify({"requested": len(changes), "applied": applied, "modified": modified, "results": results})
+
 # ================== AGENTS ==================
 @admin_bp.get("/api/agents")
 @admin_required
@@ -0,0 +1,117 @@
+# app/analytics/catalog.py
+"""
+Filter-options catalog: one document with the distinct agents, canaux,
+thematiques, actions, magasins and BUs plus the date/promo ranges.
+Writes widen it ($addToSet/$min/$max); a periodic rebuild (compaction)
+drops values that no longer appear in the tickets.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from ..tickets.rows import parse_money
+
+log = logging.getLogger(__name__)
+
+CATALOG = "catalog"
+CATALOG_ID = "filter_options"
+# liste du catalogue -> champ du ticket
+LIST_FIELDS = {"agents": "agent", "canaux": "canal", "thematiques": "thematique",
+               "actions": "action", "magasins": "magasin", "bus": "bu"}
+SOURCES = ["tickets", "tickets_archive"]
+
+def _present(v):
+    return v is not None and str(v).strip() != ""
+
+def catalog_add(db, doc):
+    """Widen the catalog with the values of one ticket (or any subset of its fields)."""
+    adds = {k: v for k, f in LIST_FIELDS.items() if _present(v := doc.get(f))}
+    update = {}
+    if adds:
+        update["$addToSet"] = adds
+    if _present(doc.get("date_creation")):
+        update["$min"] = {"min_date": doc["date_creation"]}
+        update["$max"] = {"max_date": doc["date_creation"]}
+    if "total_code_promo" in doc:
+        promo = parse_money(doc["total_code_promo"])
+        update.setdefault("$min", {})["min_promo"] = promo
+        update.setdefault("$max", {})["max_promo"] = promo
+    if update:
+        # no upsert: a missing catalog is rebuilt in full on first read
+        db[CATALOG].update_one({"_id": CATALOG_ID}, update)
+
+def catalog_add_values(db, field, values):
+    """Widen one list with many values of a ticket field in a single update."""
+    key = next(k for k, f in LIST_FIELDS.items() if f == field)
+    values = sorted({v for v in values if _present(v)}, key=str)
+    if values:
+        db[CATALOG].update_one({"_id": CATALOG_ID}, {"$addToSet": {key: {"$each": values}}})
+
+def rebuild_catalog(db):
+    """
+    Full scan (the former filter_options queries) written over the catalog
+    document. Values that catalog_add wrote during the scan are kept: they are
+    in the stored document but not in the one read before the scan.
+    """
+    before = db[CATALOG].find_one({"_id": CATALOG_ID}) or {}
+    doc = {"_id": CATALOG_ID}
+    for key, field in LIST_FIELDS.items():
+        values = set()
+        for src in SOURCES:
+            values.update(v for v in db[src].distinct(field) if _present(v))
+        doc[key] = sorted(values, key=str)
+    doc["bus"] = sorted(set(doc["bus"]) | {b for b in db["magasins"].distinct("BU") if _present(b)}, key=str)
+
+    ranges = []
+    for src in SOURCES:
+        ranges += list(db[src].aggregate([
+            {"$addFields": {"_promo": {"$toDouble": {"$replaceAll": {
+                "input": {"$toString": {"$ifNull": ["$total_code_promo", 0]}},
+                "find": ",", "replacement": "."}}}}},
+            {"$group": {"_id": None,
+                        "min_date": {"$min": "$date_creation"}, "max_date": {"$max": "$date_creation"},
+                        "min_promo": {"$min": "$_promo"}, "max_promo": {"$max": "$_promo"}}},
+        ]))
+    for k, pick in (("min_date", min), ("max_date", max), ("min_promo", min), ("max_promo", max)):
+        vals = [r[k] for r in ranges if r.get(k) is not None]
+        doc[k] = pick(vals) if vals else None
+    doc["rebuilt_at"] = datetime.now()
+
+    # one pipeline update, so nothing can land between reading and writing
+    sets = {"rebuilt_at": {"$literal": doc["rebuilt_at"]}}
+    for key in LIST_FIELDS:
+        added = {"$setDifference": [{"$ifNull": [f"${key}", []]}, {"$literal": before.get(key) or []}]}
+        sets[key] = {"$setUnion": [{"$literal": doc[key]}, added]}
+    for k, op in (("min_date", "$min"), ("max_date", "$max"), ("min_promo", "$min"), ("max_promo", "$max")):
+        current = {"$ifNull": [f"${k}", None]}
+        sets[k] = {"$cond": [{"$eq": [current, {"$literal": before.get(k)}]},
+                             {"$literal": doc[k]}, {op: [{"$literal": doc[k]}, current]}]}
+    db[CATALOG].update_one({"_id": CATALOG_ID}, [{"$set": sets}], upsert=True)
+    return db[CATALOG].find_one({"_id": CATALOG_ID})
+
+def _compact_async(app, db_getter):
+    def run():
+        with app.app_context():
+            try:
+                rebuild_catalog(db_getter())
+            except Exception:
+                log.exception("filter catalog compaction failed")
+    threading.Thread(target=run, name="catalog-compact", daemon=True).start()
+
+def load_catalog(db, db_getter):
+    """
+    The catalog document; rebuilt synchronously when missing. When older than
+    CATALOG_COMPACT_HOURS, one worker claims the compaction and runs it in the
+    background while the current document is served.
+    """
+    doc = db[CATALOG].find_one({"_id": CATALOG_ID})
+    if doc is None:
+        return rebuild_catalog(db)
+    hours = float(current_app.config.get("CATALOG_COMPACT_HOURS", 24))
+    limit = datetime.now() - timedelta(hours=hours)
+    if doc.get("rebuilt_at") and doc["rebuilt_at"] < limit:
+        claimed = db[CATALOG].update_one(
+            {"_id": CATALOG_ID, "rebuilt_at": doc["rebuilt_at"]}, {"$set": {"rebuilt_at": datetime.now()}})
+        if claimed.modified_count:
+            _compact_async(current_app._get_current_object(), db_getter)
+    return doc
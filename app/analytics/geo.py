@@ -0,0 +1,94 @@
+# app/analytics/geo.py
+"""
+Geographic drill-down region -> DR -> DM -> magasin: one $group on the leaf
+(magasin + the ticket's own region/dr/dm), then the rollup is done in Python.
+The magasins hierarchy (store index) wins over the copy stored on the ticket,
+so a store moved to another DR is counted where it is now.
+"""
+from ..tickets.stores import store_index
+from .routes import AMOUNT_EXPR, PIVOT_DIMENSIONS, TICKETS, _db, filtered_pipeline
+from ..extensions import analytics_db
+
+GEO_LEVELS = ("region", "dr", "dm", "magasin")
+GEO_UNSET = "Non renseigné"
+
+def path_match(path, stores):
+    """
+    $match narrowing the scan to one node: its magasins (trimmed, any case,
+    as bu_lookup_stages and leaf_path compare them) or tickets whose own
+    fields say so (unknown stores). Rows are re-checked after the hierarchy fill.
+    """
+    if not path:
+        return None
+    names = [it["label"].strip().lower() for it in stores.items
+             if [it[lvl] or GEO_UNSET for lvl in GEO_LEVELS[:-1]][:len(path)] == path[:3]]
+    own = {lvl: v for lvl, v in zip(GEO_LEVELS, path) if v != GEO_UNSET}
+    magasin = {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
+    return {"$or": [{"$expr": {"$in": [magasin, names]}}, own]} if own else None
+
+def geo_pipeline(filters, match=None):
+    pipeline = filtered_pipeline(filters)
+    if match:
+        pipeline.append({"$match": match})
+    pipeline.append({"$group": {
+        "_id": {lvl: PIVOT_DIMENSIONS[lvl] for lvl in GEO_LEVELS},
+        "n": {"$sum": 1},
+        "promo": {"$sum": AMOUNT_EXPR},
+    }})
+    return pipeline
+
+def leaf_path(key, stores):
+    """
+    [region, dr, dm, magasin] of one leaf group, filled from the magasins
+    table; known stores are named by their label whatever the ticket's case.
+    """
+    mag = (key.get("magasin") or "").strip()
+    store = stores.by_name.get(mag.lower()) if mag else None
+    store = store or {}
+    return [store.get(lvl) or key.get(lvl) or GEO_UNSET for lvl in GEO_LEVELS[:-1]] + [store.get("label") or mag or GEO_UNSET]
+
+def _node(name, level):
+    return {"name": name, "level": level, "n": 0, "promo": 0.0, "children": {}}
+
+def _finish(node, path):
+    node["promo"] = round(node["promo"], 2)
+    node["path"] = path
+    node["has_children"] = len(path) < len(GEO_LEVELS)
+    kids = node.pop("children")
+    if kids:
+        node["children"] = sorted((_finish(c, path + [c["name"]]) for c in kids.values()),
+                                  key=lambda c: (-c["n"], c["name"]))
+    return node
+
+def geo_tree(rows, stores, path=(), depth=1):
+    """
+    Subtree under `path` with `depth` levels of children; every node carries
+    its n / promo subtotal. Nodes cut by the depth keep has_children for a
+    later expansion.
+    """
+    path = list(path)
+    root = _node(path[-1] if path else "Total", GEO_LEVELS[len(path) - 1] if path else None)
+    stop = min(len(GEO_LEVELS), len(path) + depth)
+    for r in rows:
+        keys = leaf_path(r["_id"], stores)
+        if keys[:len(path)] != path:
+            continue
+        node = root
+        for i in range(len(path), stop + 1):
+            node["n"] += r["n"]
+            node["promo"] += r["promo"]
+            if i == stop:
+                break
+            node = node["children"].setdefault(keys[i], _node(keys[i], GEO_LEVELS[i]))
+    return _finish(root, path)
+
+def run_geo(filters, path=(), depth=1):
+    stores = store_index(_db())
+    path = list(path)
+    key = ("geo", tuple(path), tuple(sorted(filters.items())))
+    rows, stale = analytics_db.aggregate(TICKETS, geo_pipeline(filters, path_match(path, stores)), key=key)
+    data = geo_tree(rows, stores, path, depth)
+    data["levels"] = list(GEO_LEVELS)
+    if stale:
+        data["stale"] = True
+    return data
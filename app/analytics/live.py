@@ -0,0 +1,47 @@
+# app/analytics/live.py
+"""
+Live dashboard deltas: a ticket write publishes the dashboard dimensions of
+the ticket before/after the change; subscribed pages move one unit (or one
+amount) between labels instead of re-running the aggregations.
+"""
+from ..extensions import live
+from ..tickets.rows import canon_statut, parse_date, parse_money
+from ..tickets.stores import store_index
+
+# filters the page can evaluate on a delta; anything else gets resyncs only
+LIVE_FILTER_KEYS = {"agent", "canal", "thematique", "action", "magasin", "bu", "date_from", "date_to"}
+# ticket fields ticket_dims reads (projection for partial reads)
+DIM_FIELDS = ["agent", "canal", "thematique", "action", "magasin", "bu", "date_creation", "total_code_promo", "statut"]
+
+def _trim(v, default):
+    s = str(v).strip() if v is not None else ""
+    return s or default
+
+def ticket_dims(db, doc):
+    """Dashboard dimensions of one ticket, normalised like the breakdown pipelines."""
+    if not doc:
+        return None
+    magasin = str(doc.get("magasin") or "").strip()
+    bu = store_index(db).bu_by_name.get(magasin.lower()) or str(doc.get("bu") or "").strip() or "Autres"
+    dc = parse_date(doc.get("date_creation"))
+    return {
+        "agent": _trim(doc.get("agent"), "AUTRES").upper(),
+        "canal": _trim(doc.get("canal"), "AUTRES"),
+        "thematique": _trim(doc.get("thematique"), "Autres"),
+        "action": _trim(doc.get("action"), "AUTRES"),
+        "magasin": magasin,
+        "bu": bu,
+        "date": dc.strftime("%Y-%m-%d") if dc else None,
+        "amount": round(parse_money(doc.get("total_code_promo")), 2),
+        "statut": canon_statut(doc.get("statut")),
+    }
+
+def publish_ticket_change(db, before, after):
+    """before/after: full ticket dicts (None for a creation). No event when no dimension moved."""
+    b, a = ticket_dims(db, before), ticket_dims(db, after)
+    if b != a:
+        live.publish({"type": "delta", "before": b, "after": a})
+
+def publish_resync():
+    """For writes too large or too indirect to express as deltas (bulk ops, store reloads)."""
+    live.publish({"type": "resync"})
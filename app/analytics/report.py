@@ -0,0 +1,61 @@
+# app/analytics/report.py
+"""Rapport XLSX multi-onglets (breakdowns du dashboard + tickets filtrés), généré en tâche de fond."""
+from datetime import datetime
+from ..extensions import analytics_db, jobs
+from ..tickets.record import FIELDS as EXPECTED_HEADERS, TicketRecord
+from .routes import BREAKDOWNS, TICKETS, filtered_pipeline, run_breakdown
+
+SHEETS = {
+    "by_bu": ("Par BU", ["BU", "Tickets", "%"]),
+    "by_agent": ("Par agent", ["Agent", "Tickets", "%"]),
+    "by_canal": ("Par canal", ["Canal", "Tickets", "%"]),
+    "by_thematique": ("Par thématique", ["Thématique", "Tickets", "%"]),
+    "actions_montant": ("Actions - montants", ["Action", "Montant (MAD)"]),
+}
+
+def _rows(name, data):
+    if name == "actions_montant":
+        return zip(data["actions"], data["montants"])
+    return zip(data["labels"], data["values"], data["pct"])
+
+def _cell(v):
+    # openpyxl n'accepte que des scalaires
+    if v is None or isinstance(v, (str, int, float, bool, datetime)):
+        return v
+    return str(v)
+
+@jobs.task("analytics_xlsx")
+def build_analytics_xlsx(filters, progress, path):
+    from openpyxl import Workbook  # only needed by report workers
+
+    db = analytics_db.db()  # analytics pool, no time budget
+    wb = Workbook(write_only=True)  # streamed rows, constant memory
+
+    total = run_breakdown("total", filters, db)["total"]
+    ws = wb.create_sheet("Résumé")
+    ws.append(["Rapport analytics", datetime.now().strftime("%d/%m/%Y %H:%M")])
+    ws.append(["Tickets", total])
+    for k, v in sorted(filters.items()):
+        ws.append([k, v])
+
+    for i, name in enumerate(SHEETS):
+        progress(5 + 30 * i / len(SHEETS), SHEETS[name][0])
+        title, header = SHEETS[name]
+        ws = wb.create_sheet(title)
+        ws.append(header)
+        for row in _rows(name, run_breakdown(name, filters, db)):
+            ws.append(list(row))
+
+    ws = wb.create_sheet("Tickets")
+    ws.append(EXPECTED_HEADERS)
+    pipeline = filtered_pipeline({k: v for k, v in filters.items() if k in BREAKDOWNS["total"][0]})
+    pipeline.append({"$project": TicketRecord.projection()})
+    done = 0
+    for doc in db[TICKETS].aggregate(pipeline, allowDiskUse=True, batchSize=1000):
+        ws.append([_cell(v) for v in TicketRecord.from_mongo(doc).to_row()])
+        done += 1
+        if done % 1000 == 0:
+            progress(35 + 60 * done / max(total, 1), f"Tickets {done}/{total}")
+
+    progress(97, "Écriture du fichier")
+    wb.save(path)
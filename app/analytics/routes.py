@@ -1,8 +1,19 @@
-from flask import Blueprint, current_app, jsonify, render_template, request
-from ..extensions import mongo
-from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, render_template, request, g, send_file, stream_with_context, url_for
+from pymongo.errors import ExecutionTimeout
+from ..extensions import mongo, jobs, analytics_db, live, repeats
+from .live import LIVE_FILTER_KEYS
+from .catalog import LIST_FIELDS, load_catalog, rebuild_catalog
+from ..utils.http import conditional_get
+from ..utils.repeats import REPEAT_DIMS, repeat_key
+from ..tickets.lookup import LOOKUP_COLLATION, ensure_lookup_indexes, id_variants
+from ..tickets.archive import needs_cold, union_cold
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+import json, logging, time
+import click
 
 analytics_bp = Blueprint("analytics", __name__, url_prefix="/analytics")
+log = logging.getLogger(__name__)
 
 def _db():
     return mongo.cx.get_database(current_app.config["MONGO_DBNAME"])
@@ -141,157 +152,29 @@ def apply_bu_filter(pipeline, bu_filter):
         })
     return pipeline
 
-@analytics_bp.get("/")
-def page():
-    return render_template("analytics.html")
+FILTER_KEYS = ["agent", "canal", "thematique", "action", "magasin", "bu",
+               "min_promo", "max_promo", "date_from", "date_to"]
 
-# New endpoint to get filter options
-@analytics_bp.get("/api/filter_options")
-def filter_options():
-    """Get available options for each filter"""
-    db = _db()
-    
-    # Get unique agents
-    agents = db[TICKETS].distinct("agent")
-    agents = sorted([a for a in agents if a and str(a).strip()])
-    
-    # Get unique canaux
-    canaux = db[TICKETS].distinct("canal")
-    canaux = sorted([c for c in canaux if c and str(c).strip()])
-    
-    # Get unique thematiques
-    thematiques = db[TICKETS].distinct("thematique")
-    thematiques = sorted([t for t in thematiques if t and str(t).strip()])
-    
-    # Get unique actions
-    actions = db[TICKETS].distinct("action")
-    actions = sorted([a for a in actions if a and str(a).strip()])
-    
-    # Get unique magasins
-    magasins = db[TICKETS].distinct("magasin")
-    magasins = sorted([m for m in magasins if m and str(m).strip()])
-    
-    # Get unique BU values (from both tickets.bu and magasins lookup)
-    bus_from_tickets = db[TICKETS].distinct("bu")
-    bus_from_magasins = db[MAGASINS].distinct("BU")
-    all_bus = set()
-    all_bus.update([b for b in bus_from_tickets if b and str(b).strip()])
-    all_bus.update([b for b in bus_from_magasins if b and str(b).strip()])
-    bus = sorted(list(all_bus))
-    
-    # Get date range
-    date_range = list(db[TICKETS].aggregate([
-        {"$group": {
-            "_id": None,
-            "min_date": {"$min": "$date_creation"},
-            "max_date": {"$max": "$date_creation"}
-        }}
-    ]))
-    
-    min_date = None
-    max_date = None
-    if date_range:
-        min_date = date_range[0].get("min_date")
-        max_date = date_range[0].get("max_date")
-        
-        # Convert to date strings if they're datetime objects
-        if isinstance(min_date, datetime):
-            min_date = min_date.strftime("%Y-%m-%d")
-        elif isinstance(min_date, str):
-            try:
-                # Try to parse and reformat
-                parsed = datetime.strptime(min_date.split()[0], "%Y-%m-%d")
-                min_date = parsed.strftime("%Y-%m-%d")
-            except:
-                pass
-                
-        if isinstance(max_date, datetime):
-            max_date = max_date.strftime("%Y-%m-%d")
-        elif isinstance(max_date, str):
-            try:
-                # Try to parse and reformat
-                parsed = datetime.strptime(max_date.split()[0], "%Y-%m-%d")
-                max_date = parsed.strftime("%Y-%m-%d")
-            except:
-                pass
-    
-    # Get promo amount range
-    promo_range = list(db[TICKETS].aggregate([
-        {"$addFields": {
-            "_promo_numeric": {
-                "$toDouble": {
-                    "$replaceAll": {
-                        "input": {"$toString": {"$ifNull": ["$total_code_promo", 0]}},
-                        "find": ",", "replacement": "."
-                    }
-                }
-            }
-        }},
-        {"$group": {
-            "_id": None,
-            "min_promo": {"$min": "$_promo_numeric"},
-            "max_promo": {"$max": "$_promo_numeric"}
-        }}
-    ]))
-    
-    min_promo = 0
-    max_promo = 0
-    if promo_range:
-        min_promo = promo_range[0].get("min_promo", 0) or 0
-        max_promo = promo_range[0].get("max_promo", 0) or 0
-    
-    return jsonify({
-        "agents": agents,
-        "canaux": canaux,
-        "thematiques": thematiques,
-        "actions": actions,
-        "magasins": magasins,
-        "bus": bus,
-        "date_range": {
-            "min_date": min_date,
-            "max_date": max_date
-        },
-        "promo_range": {
-            "min_promo": round(min_promo, 2),
-            "max_promo": round(max_promo, 2)
+AMOUNT_EXPR = {
+    "$toDouble": {
+        "$replaceAll": {
+            "input": {"$toString": {"$ifNull": ["$total_code_promo", 0]}},
+            "find": ",", "replacement": "."
         }
-    })
-
-# 1) Contacts par BU (pie) - Enhanced with filters
-@analytics_bp.get("/api/by_bu")
-def by_bu():
-    db = _db()
-    
-    # Get filters from query parameters
-    filters = {
-        "agent": request.args.get("agent"),
-        "canal": request.args.get("canal"),
-        "thematique": request.args.get("thematique"),
-        "action": request.args.get("action"),
-        "magasin": request.args.get("magasin"),
-        "min_promo": request.args.get("min_promo"),
-        "max_promo": request.args.get("max_promo"),
-        "date_from": request.args.get("date_from"),
-        "date_to": request.args.get("date_to")
     }
-    
-    # Remove None values
-    filters = {k: v for k, v in filters.items() if v is not None and v != ""}
-    
-    pipeline = []
-    
-    # Add filter stage if filters exist
-    match_stage = build_filter_match_stage(filters)
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    
-    # Add the existing BU processing stages
-    pipeline.extend([
-        # nom du magasin normalisé
+}
+
+def request_filters(keys=FILTER_KEYS, args=None):
+    """Standard dashboard filters from the query string (empty values dropped)."""
+    args = request.args if args is None else args
+    return {k: args.get(k) for k in keys if args.get(k) not in (None, "")}
+
+def bu_lookup_stages():
+    """magasins -> bu_final (BU du magasin, sinon champ 'bu' du ticket, sinon 'Autres')."""
+    return [
         {"$addFields": {
             "_magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
         }},
-        # lookup magasins -> BU
         {"$lookup": {
             "from": MAGASINS,
             "let": {"m": "$_magasin_norm"},
@@ -302,411 +185,620 @@ def by_bu():
             ],
             "as": "_m"
         }},
-        # choisir BU: du lookup sinon champ 'bu' du ticket, sinon "Autres"
         {"$addFields": {
             "bu_final": {
                 "$let": {
                     "vars": {"bu_lookup": {"$first": "$_m.BU"}},
-                    "in": {
-                        "$trim": {"input": {
-                            "$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]
-                        }}
-                    }
+                    "in": {"$trim": {"input": {"$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]}}}
                 }
             }
-        }}
-    ])
-    
-    # Apply BU filter if specified
-    bu_filter = request.args.get("bu")
-    if bu_filter:
-        pipeline.append({
-            "$match": {
-                "bu_final": {"$regex": f"^{bu_filter}$", "$options": "i"}
-            }
-        })
-    
-    # Complete the aggregation
-    pipeline.extend([
-        {"$group": {"_id": {"$cond": [{"$eq": ["$bu_final", ""]}, "Autres", "$bu_final"]}, "n": {"$sum": 1}}},
-        {"$sort": {"n": -1}}
-    ])
-    
-    rows = list(db[TICKETS].aggregate(pipeline))
-    total = sum(r["n"] for r in rows) or 1
+        }},
+    ]
+
+def filtered_pipeline(filters, need_bu=False):
+    """$match on the standard filters (+ archive union, BU lookup/filter when needed)."""
+    pipeline = []
+    match_stage = build_filter_match_stage(filters)
+    if match_stage:
+        pipeline.append({"$match": match_stage})
+    if needs_cold(_db(), filters.get("date_from")):
+        pipeline.append(union_cold([{"$match": match_stage}] if match_stage else None))
+    if need_bu or filters.get("bu"):
+        pipeline.extend(bu_lookup_stages())
+    if filters.get("bu"):
+        pipeline.append({"$match": {"bu_final": {"$regex": f"^{filters['bu']}$", "$options": "i"}}})
+    return pipeline
+
+def _trimmed(field, upper=False):
+    expr = {"$trim": {"input": {"$toString": {"$ifNull": [f"${field}", ""]}}}}
+    return {"$toUpper": expr} if upper else expr
+
+# dimension -> expression (les vides deviennent "Autres")
+PIVOT_DIMENSIONS = {
+    "agent": _trimmed("agent", upper=True),
+    "canal": _trimmed("canal"),
+    "thematique": _trimmed("thematique"),
+    "famille": _trimmed("famille"),
+    "action": _trimmed("action"),
+    "magasin": _trimmed("magasin"),
+    "ville": _trimmed("ville"),
+    "region": _trimmed("region"),
+    "dr": _trimmed("dr"),
+    "dm": _trimmed("dm"),
+    "statut": _trimmed("statut"),
+    "bu": "$bu_final",
+}
+PIVOT_MEASURES = {"count": {"$sum": 1}, "promo": {"$sum": AMOUNT_EXPR}}
+PIVOT_OTHER = "Autres"
+
+def _fold_top(totals, top):
+    """Labels kept on an axis: the `top` biggest by total, the rest go to 'Autres'."""
+    ranked = sorted(totals, key=lambda k: totals[k], reverse=True)
+    keep = [k for k in ranked if k != PIVOT_OTHER][:top]
+    return keep + [PIVOT_OTHER] if len(keep) < len(totals) else keep
+
+@analytics_bp.get("/")
+def page():
+    return render_template("analytics.html")
+
+# New endpoint to get filter options
+@analytics_bp.get("/api/filter_options")
+@conditional_get(_db)
+def filter_options():
+    """Get available options for each filter (one read of the catalog document)"""
+    cat = load_catalog(_db(), _db)
+
+    def _day(v):
+        # 'YYYY-MM-DD HH:MM:SS' / datetime -> 'YYYY-MM-DD'
+        if isinstance(v, datetime):
+            return v.strftime("%Y-%m-%d")
+        if isinstance(v, str):
+            try:
+                return datetime.strptime(v.split()[0], "%Y-%m-%d").strftime("%Y-%m-%d")
+            except (ValueError, IndexError):
+                return v
+        return v
+
     return jsonify({
+        **{k: sorted(cat.get(k) or [], key=str) for k in LIST_FIELDS},
+        "date_range": {
+            "min_date": _day(cat.get("min_date")),
+            "max_date": _day(cat.get("max_date"))
+        },
+        "promo_range": {
+            "min_promo": round(cat.get("min_promo") or 0, 2),
+            "max_promo": round(cat.get("max_promo") or 0, 2)
+        }
+    })
+
+@analytics_bp.cli.command("rebuild-catalog")
+def rebuild_catalog_cmd():
+    """Recompute the filter-options catalog (drops values no longer used)."""
+    doc = rebuild_catalog(_db())
+    click.echo(", ".join(f"{k}: {len(doc[k])}" for k in LIST_FIELDS))
+
+# ---------- Breakdowns (pipeline + mise en forme), partagés par les vues et les rapports ----------
+
+def _shape_counts(rows):
+    total = sum(r["n"] for r in rows) or 1
+    return {
         "labels": [r["_id"] for r in rows],
         "values": [r["n"] for r in rows],
         "pct":    [round(100*r["n"]/total, 2) for r in rows],
         "total": total
-    })
-
-# 2) Traitement des contacts par agent (bar) - Enhanced with filters
-@analytics_bp.get("/api/by_agent")
-def by_agent():
-    db = _db()
-
-    # ⬇️ add "agent" here
-    filters = {
-        "agent": request.args.get("agent"),
-        "canal": request.args.get("canal"),
-        "thematique": request.args.get("thematique"),
-        "action": request.args.get("action"),
-        "magasin": request.args.get("magasin"),
-        "bu": request.args.get("bu"),
-        "min_promo": request.args.get("min_promo"),
-        "max_promo": request.args.get("max_promo"),
-        "date_from": request.args.get("date_from"),
-        "date_to": request.args.get("date_to")
     }
-    filters = {k: v for k, v in filters.items() if v is not None and v != ""}
 
-    pipeline = []
+def _shape_amounts(rows):
+    actions  = [r["_id"] for r in rows]
+    montants = [round(r["amount"], 2) for r in rows]
+    total = round(sum(montants), 2)
+    return {"actions": actions, "montants": montants, "total": total}
 
-    match_stage = build_filter_match_stage(filters)
-    if match_stage:
-        pipeline.append({"$match": match_stage})
+def _shape_total(rows):
+    return {"total": rows[0]["n"] if rows else 0}
 
-    # BU lookup (unchanged)...
-    if filters.get("bu"):
-        pipeline.extend([
-            {"$addFields": {
-                "_magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
-            }},
-            {"$lookup": {
-                "from": MAGASINS,
-                "let": {"m": "$_magasin_norm"},
-                "pipeline": [
-                    {"$addFields": {"_Magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$Magasin", ""]}}}}}},
-                    {"$match": {"$expr": {"$eq": ["$_Magasin_norm", "$$m"]}}},
-                    {"$project": {"BU": 1, "_id": 0}}
-                ],
-                "as": "_m"
-            }},
-            {"$addFields": {
-                "bu_final": {
-                    "$let": {
-                        "vars": {"bu_lookup": {"$first": "$_m.BU"}},
-                        "in": {
-                            "$trim": {"input": {
-                                "$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]
-                            }}
-                        }
-                    }
-                }
-            }},
-            {"$match": {
-                "bu_final": {"$regex": f"^{filters['bu']}$", "$options": "i"}
-            }}
-        ])
+def _pipeline_by_bu(filters):
+    return filtered_pipeline(filters, need_bu=True) + [
+        {"$group": {"_id": {"$cond": [{"$eq": ["$bu_final", ""]}, "Autres", "$bu_final"]}, "n": {"$sum": 1}}},
+        {"$sort": {"n": -1}}
+    ]
 
-    pipeline.extend([
+def _pipeline_by_agent(filters):
+    return filtered_pipeline(filters) + [
         {"$addFields": {"agent_norm": {"$toUpper": {"$trim": {"input": {"$ifNull": ["$agent", "AUTRES"]}}}}}},
         {"$group": {"_id": "$agent_norm", "n": {"$sum": 1}}},
         {"$sort": {"n": -1}},
         {"$limit": 10}
-    ])
+    ]
 
-    rows = list(db[TICKETS].aggregate(pipeline))
-    total = sum(r["n"] for r in rows) or 1
-    return jsonify({
-        "labels": [r["_id"] for r in rows],
-        "values": [r["n"] for r in rows],
-        "pct":    [round(100*r["n"]/total, 2) for r in rows],
-        "total": total
-    })
-
-# 3) Répartition par canal (donut) - Enhanced with filters
-@analytics_bp.get("/api/by_canal")
-def by_canal():
-    db = _db()
-    
-    # Get filters from query parameters
-    filters = {
-        "agent": request.args.get("agent"),
-        "thematique": request.args.get("thematique"),
-        "action": request.args.get("action"),
-        "magasin": request.args.get("magasin"),
-        "bu": request.args.get("bu"),
-        "min_promo": request.args.get("min_promo"),
-        "max_promo": request.args.get("max_promo"),
-        "date_from": request.args.get("date_from"),
-        "date_to": request.args.get("date_to")
-    }
-    
-    # Remove None values
-    filters = {k: v for k, v in filters.items() if v is not None and v != ""}
-    
-    pipeline = []
-    
-    # Add filter stage if filters exist
-    match_stage = build_filter_match_stage(filters)
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    
-    # Handle BU filter
-    if filters.get("bu"):
-        pipeline.extend([
-            {"$addFields": {
-                "_magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
-            }},
-            {"$lookup": {
-                "from": MAGASINS,
-                "let": {"m": "$_magasin_norm"},
-                "pipeline": [
-                    {"$addFields": {"_Magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$Magasin", ""]}}}}}},
-                    {"$match": {"$expr": {"$eq": ["$_Magasin_norm", "$$m"]}}},
-                    {"$project": {"BU": 1, "_id": 0}}
-                ],
-                "as": "_m"
-            }},
-            {"$addFields": {
-                "bu_final": {
-                    "$let": {
-                        "vars": {"bu_lookup": {"$first": "$_m.BU"}},
-                        "in": {
-                            "$trim": {"input": {
-                                "$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]
-                            }}
-                        }
-                    }
-                }
-            }},
-            {"$match": {
-                "bu_final": {"$regex": f"^{filters['bu']}$", "$options": "i"}
-            }}
-        ])
-    
-    # Complete the aggregation
-    pipeline.extend([
+def _pipeline_by_canal(filters):
+    return filtered_pipeline(filters) + [
         {"$addFields": {"canal_norm": {"$trim": {"input": {"$ifNull": ["$canal", "AUTRES"]}}}}},
         {"$group": {"_id": {"$cond": [{"$eq": ["$canal_norm", "" ]}, "AUTRES", "$canal_norm"]}, "n": {"$sum": 1}}},
         {"$sort": {"n": -1}}
-    ])
-    
-    rows = list(db[TICKETS].aggregate(pipeline))
-    total = sum(r["n"] for r in rows) or 1
-    return jsonify({
-        "labels": [r["_id"] for r in rows],
-        "values": [r["n"] for r in rows],
-        "pct":    [round(100*r["n"]/total, 2) for r in rows],
-        "total": total
-    })
+    ]
 
-# 4) Contacts par thématique (bar + %) - Enhanced with filters
-@analytics_bp.get("/api/by_thematique")
-def by_thematique():
-    db = _db()
-    
-    # Get filters from query parameters
-    filters = {
-        "agent": request.args.get("agent"),
-        "canal": request.args.get("canal"),
-        "action": request.args.get("action"),
-        "magasin": request.args.get("magasin"),
-        "bu": request.args.get("bu"),
-        "min_promo": request.args.get("min_promo"),
-        "max_promo": request.args.get("max_promo"),
-        "date_from": request.args.get("date_from"),
-        "date_to": request.args.get("date_to")
-    }
-    
-    # Remove None values
-    filters = {k: v for k, v in filters.items() if v is not None and v != ""}
-    
-    pipeline = []
-    
-    # Add filter stage if filters exist
-    match_stage = build_filter_match_stage(filters)
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    
-    # Handle BU filter
-    if filters.get("bu"):
-        pipeline.extend([
-            {"$addFields": {
-                "_magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
-            }},
-            {"$lookup": {
-                "from": MAGASINS,
-                "let": {"m": "$_magasin_norm"},
-                "pipeline": [
-                    {"$addFields": {"_Magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$Magasin", ""]}}}}}},
-                    {"$match": {"$expr": {"$eq": ["$_Magasin_norm", "$$m"]}}},
-                    {"$project": {"BU": 1, "_id": 0}}
-                ],
-                "as": "_m"
-            }},
-            {"$addFields": {
-                "bu_final": {
-                    "$let": {
-                        "vars": {"bu_lookup": {"$first": "$_m.BU"}},
-                        "in": {
-                            "$trim": {"input": {
-                                "$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]
-                            }}
-                        }
-                    }
-                }
-            }},
-            {"$match": {
-                "bu_final": {"$regex": f"^{filters['bu']}$", "$options": "i"}
-            }}
-        ])
-    
-    # Complete the aggregation
-    pipeline.extend([
+def _pipeline_by_thematique(filters):
+    return filtered_pipeline(filters) + [
         {"$addFields": {"th": {"$trim": {"input": {"$ifNull": ["$thematique", "Autres"]}}}}},
         {"$group": {"_id": {"$cond": [{"$eq": ["$th", ""]}, "Autres", "$th"]}, "n": {"$sum": 1}}},
         {"$sort": {"n": -1}},
         {"$limit": 8}
-    ])
-    
-    rows = list(db[TICKETS].aggregate(pipeline))
-    total = sum(r["n"] for r in rows) or 1
-    return jsonify({
-        "labels": [r["_id"] for r in rows],
-        "values": [r["n"] for r in rows],
-        "pct":    [round(100*r["n"]/total, 2) for r in rows],
-        "total": total
-    })
+    ]
 
-# 5) Tableau Actions / Montant (sum total_code_promo) - Enhanced with filters
-@analytics_bp.get("/api/actions_montant")
-def actions_montant_alias():
-    db = _db()
-    
-    # Get filters from query parameters
-    filters = {
-        "agent": request.args.get("agent"),
-        "canal": request.args.get("canal"),
-        "thematique": request.args.get("thematique"),
-        "magasin": request.args.get("magasin"),
-        "bu": request.args.get("bu"),
-        "date_from": request.args.get("date_from"),
-        "date_to": request.args.get("date_to")
-    }
-    
-    # Remove None values
-    filters = {k: v for k, v in filters.items() if v is not None and v != ""}
-    
-    amount = {
-        "$toDouble": {
-            "$replaceAll": {
-                "input": {"$toString": {"$ifNull": ["$total_code_promo", 0]}},
-                "find": ",", "replacement": "."
-            }
-        }
-    }
-    
-    pipeline = []
-    
-    # Add filter stage if filters exist
-    match_stage = build_filter_match_stage(filters)
-    if match_stage:
-        pipeline.append({"$match": match_stage})
-    
-    # Handle BU filter
-    if filters.get("bu"):
-        pipeline.extend([
-            {"$addFields": {
-                "_magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
-            }},
-            {"$lookup": {
-                "from": MAGASINS,
-                "let": {"m": "$_magasin_norm"},
-                "pipeline": [
-                    {"$addFields": {"_Magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$Magasin", ""]}}}}}},
-                    {"$match": {"$expr": {"$eq": ["$_Magasin_norm", "$$m"]}}},
-                    {"$project": {"BU": 1, "_id": 0}}
-                ],
-                "as": "_m"
-            }},
-            {"$addFields": {
-                "bu_final": {
-                    "$let": {
-                        "vars": {"bu_lookup": {"$first": "$_m.BU"}},
-                        "in": {
-                            "$trim": {"input": {
-                                "$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]
-                            }}
-                        }
-                    }
-                }
-            }},
-            {"$match": {
-                "bu_final": {"$regex": f"^{filters['bu']}$", "$options": "i"}
-            }}
-        ])
-    
-    # Complete the aggregation
-    pipeline.extend([
-        {"$addFields": {"_amount": amount, "_action": {
+def _pipeline_actions_montant(filters):
+    return filtered_pipeline(filters) + [
+        {"$addFields": {"_amount": AMOUNT_EXPR, "_action": {
             "$trim": {"input": {"$ifNull": ["$action", "AUTRES"]}}
         }}},
         {"$addFields": {"_action": {"$cond": [{"$eq": ["$_action", ""]}, "AUTRES", "$_action"]}}},
         {"$group": {"_id": "$_action", "amount": {"$sum": "$_amount"}}},
         {"$sort": {"amount": -1}}
-    ])
-    
-    rows = list(db[TICKETS].aggregate(pipeline))
-    actions  = [r["_id"] for r in rows]
-    montants = [round(r["amount"], 2) for r in rows]
-    total = round(sum(montants), 2)
-    return jsonify({"actions": actions, "montants": montants, "total": total})
+    ]
+
+def _pipeline_total(filters):
+    return filtered_pipeline(filters) + [{"$count": "n"}]
+
+# nom -> (filtres acceptés, pipeline, mise en forme)
+BREAKDOWNS = {
+    "by_bu": (FILTER_KEYS, _pipeline_by_bu, _shape_counts),
+    "by_agent": (FILTER_KEYS, _pipeline_by_agent, _shape_counts),
+    "by_canal": ([k for k in FILTER_KEYS if k != "canal"], _pipeline_by_canal, _shape_counts),
+    "by_thematique": ([k for k in FILTER_KEYS if k != "thematique"], _pipeline_by_thematique, _shape_counts),
+    "actions_montant": (["agent", "canal", "thematique", "magasin", "bu", "date_from", "date_to"],
+                        _pipeline_actions_montant, _shape_amounts),
+    "total": (FILTER_KEYS, _pipeline_total, _shape_total),
+}
+
+def breakdown_pipeline(name, filters):
+    keys, build, _ = BREAKDOWNS[name]
+    return build({k: v for k, v in filters.items() if k in keys})
+
+def split_tail(pipeline):
+    """Pipeline without its final $sort/$limit (re-applied on merged results) + the limit."""
+    body, limit = list(pipeline), None
+    while body and ("$sort" in body[-1] or "$limit" in body[-1]):
+        limit = body.pop().get("$limit", limit)
+    return body, limit
+
+def run_breakdown(name, filters, db=None):
+    """
+    Run one dashboard breakdown for a filters dict (no request needed).
+    Without db: analytics client under its time budget, 'stale': True when
+    the last good result had to be served. With db (background jobs): no budget.
+    """
+    pipeline = breakdown_pipeline(name, filters)
+    if db is not None:
+        return BREAKDOWNS[name][2](list(db[TICKETS].aggregate(pipeline, allowDiskUse=True)))
+    return shape_breakdown(name, *analytics_db.aggregate(TICKETS, pipeline, key=(name, tuple(sorted(filters.items())))))
+
+def shape_breakdown(name, rows, stale=False):
+    data = BREAKDOWNS[name][2](rows)
+    if stale:
+        data["stale"] = True
+    return data
+
+def submit_breakdown(name, filters):
+    """Same as run_breakdown, scheduled on the analytics event loop: Future of (rows, stale)."""
+    return analytics_db.submit(TICKETS, breakdown_pipeline(name, filters), key=(name, tuple(sorted(filters.items()))))
+
+# ---------- Comparaison de périodes (une agrégation, groupée par période) ----------
+
+COMPARE_BREAKDOWNS = ["by_bu", "by_agent", "by_canal", "by_thematique", "actions_montant"]
+COMPARE_MODES = ("previous", "year")
+
+def _year_before(d):
+    try:
+        return d.replace(year=d.year - 1)
+    except ValueError:  # 29 février
+        return d.replace(year=d.year - 1, day=28)
+
+def compare_windows(date_from, date_to, mode):
+    """{"current": (start, end), "previous": (start, end)} as datetimes, whole days."""
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+    if end < start:
+        raise ValueError("date_to < date_from")
+    if mode == "year":
+        prev = (_year_before(start), _year_before(end))
+        if prev[1] >= start:  # a ticket belongs to one window only
+            raise ValueError("période de plus d'un an")
+    else:  # same length, just before
+        prev_end = start - timedelta(days=1)
+        prev = (prev_end - (end - start), prev_end)
+    day = timedelta(hours=23, minutes=59, seconds=59)
+    return {"current": (start, end + day), "previous": (prev[0], prev[1] + day)}
+
+def compare_pipeline(name, filters, windows):
+    """
+    The breakdown's own stages over both windows, its $group keyed by
+    (label, period) instead of label. Returns (pipeline, top-N limit).
+    """
+    span = {**filters,
+            "date_from": min(w[0] for w in windows.values()).strftime("%Y-%m-%d"),
+            "date_to": max(w[1] for w in windows.values()).strftime("%Y-%m-%d")}
+    body, limit = split_tail(breakdown_pipeline(name, span))
+    group = dict(body.pop()["$group"])
+    group["_id"] = {"k": group["_id"], "p": "$_period"}
+    tag = {"$switch": {"branches": [
+        {"case": {"$and": [{"$gte": ["$_dc", a]}, {"$lte": ["$_dc", b]}]}, "then": period}
+        for period, (a, b) in windows.items()], "default": None}}
+    return body + [
+        {"$addFields": {"_dc": {"$dateFromString": {"dateString": "$date_creation", "onError": None}}}},
+        {"$addFields": {"_period": tag}},
+        {"$match": {"_period": {"$ne": None}}},
+        {"$group": group},
+    ], limit
+
+def shape_compare(rows, limit=None):
+    """Per label: current, previous, absolute and % delta (None when previous is 0)."""
+    measure = "amount" if rows and "amount" in rows[0] else "n"
+    by_label = {}
+    for r in rows:
+        by_label.setdefault(r["_id"]["k"], {"current": 0, "previous": 0})[r["_id"]["p"]] += r[measure]
+    items = sorted(by_label.items(), key=lambda kv: (kv[1]["current"], kv[1]["previous"]), reverse=True)
+    if limit:
+        items = items[:limit]
+    cur = [round(v["current"], 2) for _, v in items]
+    prev = [round(v["previous"], 2) for _, v in items]
+    total_cur, total_prev = round(sum(cur), 2), round(sum(prev), 2)
+    return {
+        "labels": [k for k, _ in items],
+        "current": cur,
+        "previous": prev,
+        "delta": [round(c - p, 2) for c, p in zip(cur, prev)],
+        "delta_pct": [round(100 * (c - p) / p, 2) if p else None for c, p in zip(cur, prev)],
+        "total": {"current": total_cur, "previous": total_prev, "delta": round(total_cur - total_prev, 2),
+                  "delta_pct": round(100 * (total_cur - total_prev) / total_prev, 2) if total_prev else None},
+    }
+
+def run_compare(name, filters, mode):
+    """Current vs previous window (or same window last year) for one breakdown, one aggregation."""
+    windows = compare_windows(filters["date_from"], filters["date_to"], mode)
+    keys = BREAKDOWNS[name][0]
+    pipeline, limit = compare_pipeline(name, {k: v for k, v in filters.items() if k in keys}, windows)
+    rows, stale = analytics_db.aggregate(TICKETS, pipeline, key=("compare", mode, name, tuple(sorted(filters.items()))))
+    data = shape_compare(rows, limit)
+    data["compare"] = mode
+    data["windows"] = {p: [a.strftime("%Y-%m-%d"), b.strftime("%Y-%m-%d")] for p, (a, b) in windows.items()}
+    if stale:
+        data["stale"] = True
+    return data
+
+def _json_result(data):
+    """jsonify; stale fallbacks are flagged and kept out of the HTTP cache."""
+    resp = jsonify(data)
+    if data.get("stale"):
+        resp.headers["Cache-Control"] = "no-store"
+        resp.headers["X-Analytics-Stale"] = "1"
+    return resp
+
+def _serve_breakdown(name):
+    """
+    Live breakdown for the request filters, the stored one with ?snapshot=<id>,
+    or current vs previous period with ?compare=previous|year (date_from/date_to required).
+    """
+    snapshot_id = request.args.get("snapshot")
+    mode = request.args.get("compare")
+    if mode and name in COMPARE_BREAKDOWNS:
+        filters = request_filters()
+        if mode not in COMPARE_MODES:
+            return jsonify({"error": "compare: previous ou year"}), 400
+        try:
+            compare_windows(filters.get("date_from", ""), filters.get("date_to", ""), mode)
+        except ValueError:
+            return jsonify({"error": "date_from <= date_to (AAAA-MM-JJ) requis pour comparer, sur un an au plus avec compare=year"}), 400
+        return _json_result(run_compare(name, filters, mode))
+    if not snapshot_id:
+        return _json_result(run_breakdown(name, request_filters()))
+    data = load_snapshot(_db(), snapshot_id, name)
+    if data is None:
+        return jsonify({"error": "instantané introuvable"}), 404
+    return jsonify(data)
+
+@analytics_bp.get("/api/snapshots")
+@conditional_get(_db)
+def snapshots():
+    rows = list_snapshots(_db())
+    for r in rows:
+        r["created_at"] = r["created_at"].strftime("%d/%m/%Y %H:%M")
+    return jsonify(rows)
+
+@analytics_bp.cli.command("recompute")
+@click.option("--from", "date_from", required=True, help="YYYY-MM-DD")
+@click.option("--to", "date_to", required=True, help="YYYY-MM-DD")
+@click.option("--workers", type=int, default=None, help="processus (défaut: nombre de CPU)")
+@click.option("--filter", "filters", multiple=True, help="clé=valeur (agent, canal, magasin, bu...)")
+@click.option("--id", "snapshot_id", default=None, help="identifiant de l'instantané")
+def recompute_cmd(date_from, date_to, workers, filters, snapshot_id):
+    """Recompute the dashboard breakdowns month by month in parallel into a snapshot."""
+    flt = dict(f.split("=", 1) for f in filters if "=" in f)
+    unknown = set(flt) - set(FILTER_KEYS)
+    if unknown:
+        raise click.BadParameter(f"filtres inconnus: {', '.join(sorted(unknown))}")
+    try:
+        doc = recompute_snapshot(_db(), date_from, date_to, flt, workers, snapshot_id, echo=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"instantané {doc['_id']}: {doc['results']['total']['total']} tickets, "
+               f"{doc['partitions']} mois en {doc['seconds']}s")
+
+@analytics_bp.errorhandler(ExecutionTimeout)
+def _timeout(e):
+    # over budget and no earlier result for these filters
+    return jsonify({"error": "Analyse trop longue, réessayez ou réduisez la période."}), 503
+
+# 0) Tout le tableau de bord en une requête: agrégations concurrentes, NDJSON au fil de l'eau
+DASHBOARD_BREAKDOWNS = ("total", "by_bu", "by_agent", "by_canal", "by_thematique", "actions_montant")
+DASHBOARD_PING_SECONDS = 1.0
+
+@analytics_bp.get("/api/dashboard")
+def dashboard():
+    """
+    Every dashboard breakdown for the request filters, all submitted at once so
+    the request takes about as long as the slowest one. One JSON line per
+    breakdown ({name, data} or {name, error}) as soon as it is done. Queries are
+    submitted once the response body is read, so a client gone before that
+    starts none; when it goes away later the ones still running are cancelled.
+    """
+    filters = request_filters()
+
+    def stream():
+        futures = {}
+        try:
+            for name in DASHBOARD_BREAKDOWNS:
+                futures[submit_breakdown(name, filters)] = name
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=DASHBOARD_PING_SECONDS, return_when=FIRST_COMPLETED)
+                if not done:
+                    # empty line: a client that went away fails this write
+                    yield "\n"
+                for fut in done:
+                    name = futures[fut]
+                    try:
+                        line = {"name": name, "data": shape_breakdown(name, *fut.result())}
+                    except ExecutionTimeout:
+                        line = {"name": name, "error": "Analyse trop longue, réessayez ou réduisez la période."}
+                    except Exception:
+                        log.exception("dashboard breakdown %s failed", name)
+                        line = {"name": name, "error": "Erreur lors du calcul"}
+                    yield json.dumps(line, default=str) + "\n"
+        finally:
+            # GeneratorExit on a closed connection lands here too
+            for fut in futures:
+                fut.cancel()
+
+    resp = Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+    # one response mixes fresh and possibly stale results: never cached
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# 1) Contacts par BU (pie) - Enhanced with filters
+@analytics_bp.get("/api/by_bu")
+@conditional_get(_db)
+def by_bu():
+    return _serve_breakdown("by_bu")
+
+# 2) Traitement des contacts par agent (bar) - Enhanced with filters
+@analytics_bp.get("/api/by_agent")
+@conditional_get(_db)
+def by_agent():
+    return _serve_breakdown("by_agent")
+
+# 3) Répartition par canal (donut) - Enhanced with filters
+@analytics_bp.get("/api/by_canal")
+@conditional_get(_db)
+def by_canal():
+    return _serve_breakdown("by_canal")
+
+# 4) Contacts par thématique (bar + %) - Enhanced with filters
+@analytics_bp.get("/api/by_thematique")
+@conditional_get(_db)
+def by_thematique():
+    return _serve_breakdown("by_thematique")
+
+# 5) Tableau Actions / Montant (sum total_code_promo) - Enhanced with filters
+@analytics_bp.get("/api/actions_montant")
+@conditional_get(_db)
+def actions_montant_alias():
+    return _serve_breakdown("actions_montant")
 
 
 @analytics_bp.get("/api/total")
+@conditional_get(_db)
 def total_tickets():
-    db = _db()
-    filters = {
-        "agent": request.args.get("agent"),
-        "canal": request.args.get("canal"),
-        "thematique": request.args.get("thematique"),
-        "action": request.args.get("action"),
-        "magasin": request.args.get("magasin"),
-        "bu": request.args.get("bu"),
-        "date_from": request.args.get("date_from"),
-        "date_to": request.args.get("date_to"),
-        "min_promo": request.args.get("min_promo"),
-        "max_promo": request.args.get("max_promo"),
-    }
-    filters = {k: v for k, v in filters.items() if v not in (None, "")}
+    return _serve_breakdown("total")
 
-    pipeline = []
-    match_stage = build_filter_match_stage(filters)
-    if match_stage:
-        pipeline.append({"$match": match_stage})
+# 6) Tableau croisé générique (heatmap) : rows x cols, count ou promo
+@analytics_bp.get("/api/pivot")
+@conditional_get(_db)
+def pivot():
+    rows_dim = request.args.get("rows", "agent")
+    cols_dim = request.args.get("cols", "thematique")
+    measure = request.args.get("measure", "count")
+    if rows_dim not in PIVOT_DIMENSIONS or cols_dim not in PIVOT_DIMENSIONS or rows_dim == cols_dim:
+        return jsonify({"error": "dimensions invalides", "dimensions": sorted(PIVOT_DIMENSIONS)}), 400
+    if measure not in PIVOT_MEASURES:
+        return jsonify({"error": "mesure invalide", "measures": sorted(PIVOT_MEASURES)}), 400
+    try:
+        top = max(1, min(int(request.args.get("top", 10)), 50))
+    except ValueError:
+        top = 10
 
-    # Filtre BU si présent (même bloc que tes autres endpoints)
-    if filters.get("bu"):
-        pipeline += [
-            {"$addFields": {
-                "_magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$magasin", ""]}}}}
-            }},
-            {"$lookup": {
-                "from": MAGASINS,
-                "let": {"m": "$_magasin_norm"},
-                "pipeline": [
-                    {"$addFields": {"_Magasin_norm": {"$toLower": {"$trim": {"input": {"$ifNull": ["$Magasin", ""]}}}}}},
-                    {"$match": {"$expr": {"$eq": ["$_Magasin_norm", "$$m"]}}},
-                    {"$project": {"BU": 1, "_id": 0}}
-                ],
-                "as": "_m"
-            }},
-            {"$addFields": {
-                "bu_final": {
-                    "$let": {
-                        "vars": {"bu_lookup": {"$first": "$_m.BU"}},
-                        "in": {"$trim": {"input": {"$ifNull": ["$$bu_lookup", {"$ifNull": ["$bu", "Autres"]}]}}}
-                    }
-                }
-            }},
-            {"$match": {"bu_final": {"$regex": f"^{filters['bu']}$", "$options": "i"}}},
-        ]
+    filters = request_filters()
+    pipeline = filtered_pipeline(filters, need_bu="bu" in (rows_dim, cols_dim))
+    # une seule passe: une cellule par couple (ligne, colonne)
+    pipeline.extend([
+        {"$group": {
+            "_id": {"r": PIVOT_DIMENSIONS[rows_dim], "c": PIVOT_DIMENSIONS[cols_dim]},
+            "v": PIVOT_MEASURES[measure],
+        }},
+    ])
+    key = ("pivot", rows_dim, cols_dim, measure, tuple(sorted(filters.items())))
+    cells, stale = analytics_db.aggregate(TICKETS, pipeline, key=key)
+    cells = [dict(c) for c in cells]  # annotated below: keep the cached rows intact
+
+    row_tot, col_tot = {}, {}
+    for cell in cells:
+        r = cell["_id"].get("r") or PIVOT_OTHER
+        c = cell["_id"].get("c") or PIVOT_OTHER
+        cell["r"], cell["c"] = r, c
+        row_tot[r] = row_tot.get(r, 0) + cell["v"]
+        col_tot[c] = col_tot.get(c, 0) + cell["v"]
+
+    row_labels, col_labels = _fold_top(row_tot, top), _fold_top(col_tot, top)
+    ri = {k: i for i, k in enumerate(row_labels)}
+    ci = {k: i for i, k in enumerate(col_labels)}
+    matrix = [[0] * len(col_labels) for _ in row_labels]
+    for cell in cells:
+        i = ri.get(cell["r"], ri.get(PIVOT_OTHER))
+        j = ci.get(cell["c"], ci.get(PIVOT_OTHER))
+        matrix[i][j] += cell["v"]
+
+    rnd = (lambda v: round(v, 2)) if measure == "promo" else (lambda v: v)
+    matrix = [[rnd(v) for v in row] for row in matrix]
+    return _json_result({
+        "rows": row_labels,
+        "cols": col_labels,
+        "values": matrix,
+        "row_totals": [rnd(sum(row)) for row in matrix],
+        "col_totals": [rnd(sum(matrix[i][j] for i in range(len(row_labels)))) for j in range(len(col_labels))],
+        "total": rnd(sum(row_tot.values())),
+        "measure": measure,
+        **({"stale": True} if stale else {}),
+    })
+
+# 6b) Drill-down géographique région -> DR -> DM -> magasin (sous-totaux à chaque niveau)
+@analytics_bp.get("/api/geo")
+@conditional_get(_db)
+def geo():
+    """?path=<region>&path=<dr>... : the node to expand; ?depth=1..4 (default 1, 4: whole tree)."""
+    path = [p for p in request.args.getlist("path") if p]
+    if len(path) >= len(GEO_LEVELS):
+        return jsonify({"error": "un magasin n'a pas de sous-niveau"}), 400
+    try:
+        depth = max(1, min(int(request.args.get("depth", 1)), len(GEO_LEVELS)))
+    except ValueError:
+        return jsonify({"error": "depth: entier entre 1 et 4"}), 400
+    return _json_result(run_geo(request_filters(), path, depth))
+
+# 6c) Clients / commandes les plus récurrents (top-K du sketch, sans scan des tickets)
+@analytics_bp.get("/api/repeaters")
+def repeaters():
+    """Approximate counts (count-min sketch, all periods): the dashboard filters do not apply."""
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    dim = request.args.get("dim", "id_client")
+    if dim not in REPEAT_DIMS:
+        return jsonify({"error": "dim: id_client ou num_cmd"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+    except ValueError:
+        limit = 20
+    rows, updated_at = repeats.top(dim, limit)
+    names = {}
+    # keys are counted upper-cased: match any stored case (and legacy numbers)
+    ensure_lookup_indexes(_db())
+    spellings = [v for r in rows for v in id_variants(r["key"])]
+    cur = _db()[TICKETS].find({dim: {"$in": spellings}}, {"_id": 0, dim: 1, "nom_prenom": 1},
+                              collation=LOOKUP_COLLATION)
+    for t in cur:
+        names.setdefault(repeat_key(t.get(dim)), t.get("nom_prenom") or "")
+    return jsonify({
+        "dim": dim,
+        "rows": [{**r, "nom_prenom": names.get(r["key"], "")} for r in rows],
+        "updated_at": updated_at.strftime("%d/%m/%Y %H:%M") if updated_at else None,
+    })
+
+# 7) Rapport XLSX en tâche de fond: soumettre, suivre, télécharger
+@analytics_bp.post("/api/reports")
+def report_submit():
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    filters = request_filters(args=request.get_json(silent=True) or {})
+    filename = f"analytics_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+    job_id = jobs.submit("analytics_xlsx", filters, g.user.get("username"), filename)
+    return jsonify({"job_id": job_id, "status_url": url_for("analytics.report_status", job_id=job_id)}), 202
+
+def _own_job(job_id):
+    job = jobs.get(job_id)
+    if not job or job.get("user") != g.user.get("username"):
+        return None
+    return job
+
+@analytics_bp.get("/api/reports/<job_id>")
+def report_status(job_id):
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    job = _own_job(job_id)
+    if not job:
+        return jsonify({"error": "introuvable"}), 404
+    out = {k: job.get(k) for k in ["status", "progress", "message", "error", "filename"]}
+    if job["status"] == "done":
+        out["download_url"] = url_for("analytics.report_download", job_id=job_id)
+    return jsonify(out)
+
+@analytics_bp.get("/api/reports/<job_id>/download")
+def report_download(job_id):
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    job = _own_job(job_id)
+    stream = jobs.open(job) if job and job["status"] == "done" else None
+    if stream is None:
+        return jsonify({"error": "rapport non disponible"}), 404
+    return send_file(stream, as_attachment=True, download_name=job["filename"],
+                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+# 8) Flux temps réel (SSE): deltas publiés par les écritures de tickets
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@analytics_bp.get("/api/live")
+def live_stream():
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    filters = request_filters()
+    deltas = set(filters) <= LIVE_FILTER_KEYS
+    sub = live.subscribe(g.user.get("username"))
+    if sub is None:
+        return jsonify({"error": "trop de connexions temps réel"}), 503
+    cfg = current_app.config
+    keepalive = cfg.get("LIVE_KEEPALIVE_SECONDS", 15)
+    resync_every = cfg.get("LIVE_RESYNC_SECONDS", 30)
+    max_seconds = cfg.get("LIVE_MAX_SECONDS", 300)
+
+    def stream():
+        started = last_resync = time.monotonic()
+        pending = False
+        try:
+            yield "retry: 5000\n" + _sse("hello", {"deltas": deltas})
+            # bounded lifetime: EventSource reconnects, and the page resyncs on reconnect
+            while time.monotonic() - started < max_seconds:
+                ev = sub.get(timeout=keepalive)
+                if sub.lagged:
+                    sub.reset()
+                    pending = True
+                elif ev is not None:
+                    if deltas and ev.get("type") == "delta":
+                        yield f"id: {ev['id']}\n" + _sse("delta", {"before": ev["before"], "after": ev["after"]})
+                    else:
+                        pending = True
+                # resyncs are throttled: at most one per LIVE_RESYNC_SECONDS
+                if pending and time.monotonic() - last_resync >= resync_every:
+                    yield _sse("resync", {})
+                    pending, last_resync = False, time.monotonic()
+                elif ev is None:
+                    yield ": ping\n\n"
+        finally:
+            live.unsubscribe(sub)
 
-    pipeline.append({"$count": "n"})
+    resp = Response(stream(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: no buffering of the stream
+    return resp
 
-    rows = list(db[TICKETS].aggregate(pipeline))
-    total = rows[0]["n"] if rows else 0
-    return jsonify({"total": total})
+from . import report  # noqa: E402  (enregistre la tâche analytics_xlsx)
+from .snapshot import list_snapshots, load_snapshot, recompute_snapshot  # noqa: E402
+from .geo import GEO_LEVELS, run_geo  # noqa: E402
@@ -0,0 +1,116 @@
+# app/analytics/snapshot.py
+"""
+Offline recompute of the dashboard breakdowns over long periods: the period
+is split into monthly partitions aggregated in a process pool (one Mongo
+client per process), the partial counts/sums are merged and shaped like the
+live endpoints, and the report is stored in a snapshot the dashboard loads
+in one read.
+
+Each partition starts with a string range on date_creation so it is an index
+scan. That range only sees "YYYY-mm-dd..." values: rather than silently
+dropping other stored dates (which the live breakdowns parse), a recompute
+is refused while any remain, until `flask tickets normalize-dates` has run.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+from pymongo import MongoClient
+from ..extensions import analytics_db
+from ..utils.http import bump_data_version
+from ..tickets.queue import ISO_DATE
+from .routes import BREAKDOWNS, TICKETS, breakdown_pipeline, split_tail
+
+SNAPSHOTS = "analytics_snapshots"
+SNAPSHOT_BREAKDOWNS = ("by_bu", "by_agent", "by_canal", "by_thematique", "actions_montant", "total")
+MEASURES = ("n", "amount")
+
+def month_partitions(date_from, date_to):
+    """[(first_day, last_day), ...] as YYYY-MM-DD, one per month, clipped to the period."""
+    start = datetime.strptime(date_from, "%Y-%m-%d").date()
+    end = datetime.strptime(date_to, "%Y-%m-%d").date()
+    parts = []
+    while start <= end:
+        nxt = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        parts.append((start.isoformat(), min(nxt - timedelta(days=1), end).isoformat()))
+        start = nxt
+    return parts
+
+def partition_pipelines(filters, first, last):
+    """Per-breakdown pipelines for one month, with a sargable date_creation range in front."""
+    after = (datetime.strptime(last, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    part = {**filters, "date_from": first, "date_to": last}
+    out = {}
+    for name in SNAPSHOT_BREAKDOWNS:
+        body, _ = split_tail(breakdown_pipeline(name, part))
+        out[name] = [{"$match": {"date_creation": {"$gte": first, "$lt": after}}}] + body
+    return out
+
+def _run_partition(uri, dbname, read_preference, pipelines):
+    # runs in a worker process: its own client, closed with the task
+    client = MongoClient(uri, readPreference=read_preference, appname="ticketing-recompute")
+    try:
+        db = client.get_database(dbname)
+        return {name: list(db[TICKETS].aggregate(p, allowDiskUse=True)) for name, p in pipelines.items()}
+    finally:
+        client.close()
+
+def merge_rows(parts, limit=None):
+    """Sum the {_id, n|amount} rows of several partitions; sorted desc, top limit."""
+    acc = {}
+    for rows in parts:
+        for r in rows:
+            row = acc.setdefault(r.get("_id"), {"_id": r.get("_id")})
+            for m in MEASURES:
+                if m in r:
+                    row[m] = row.get(m, 0) + r[m]
+    rows = sorted(acc.values(), key=lambda r: r.get("n", r.get("amount", 0)), reverse=True)
+    return rows[:limit] if limit else rows
+
+def recompute_snapshot(db, date_from, date_to, filters=None, workers=None, snapshot_id=None, echo=print):
+    """
+    Aggregate the period month by month in parallel and store the snapshot
+    document. ValueError for an invalid period or non-normalised dates.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if k not in ("date_from", "date_to")}
+    parts = month_partitions(date_from, date_to)
+    db[TICKETS].create_index("date_creation")
+    legacy = db[TICKETS].find_one({"date_creation": {"$exists": True, "$nin": [None, ""], "$not": ISO_DATE}},
+                                  {"_id": 0, "id": 1, "date_creation": 1})
+    if legacy:
+        raise ValueError(f"ticket {legacy.get('id')}: date_creation {legacy['date_creation']!r} non normalisée, "
+                         "lancer d'abord `flask tickets normalize-dates`")
+    t0 = time.perf_counter()
+
+    args = (analytics_db.uri, analytics_db.db().name, analytics_db.read_preference)
+    results = {name: [] for name in SNAPSHOT_BREAKDOWNS}
+    # spawn: never fork a process that already holds Mongo clients and threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        futures = {pool.submit(_run_partition, *args, partition_pipelines(filters, a, b)): a for a, b in parts}
+        for fut in futures:
+            for name, rows in fut.result().items():
+                results[name].append(rows)
+            echo(f"{futures[fut][:7]} ok")
+
+    doc = {
+        "_id": snapshot_id or f"{date_from}_{date_to}",
+        "date_from": date_from, "date_to": date_to, "filters": filters,
+        "partitions": len(parts),
+        "created_at": datetime.now(),
+        "results": {},
+    }
+    for name in SNAPSHOT_BREAKDOWNS:
+        _, limit = split_tail(breakdown_pipeline(name, filters))
+        doc["results"][name] = BREAKDOWNS[name][2](merge_rows(results[name], limit))
+    doc["seconds"] = round(time.perf_counter() - t0, 2)
+    db[SNAPSHOTS].replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    bump_data_version(db)  # cached ?snapshot= responses carry the data version
+    return doc
+
+def list_snapshots(db):
+    return list(db[SNAPSHOTS].find({}, {"results": 0}).sort("created_at", -1))
+
+def load_snapshot(db, snapshot_id, name):
+    """One breakdown of a stored snapshot, or None."""
+    doc = db[SNAPSHOTS].find_one({"_id": snapshot_id}, {f"results.{name}": 1})
+    return (doc or {}).get("results", {}).get(name)
@@ -8,3 +8,45 @@ class Config:
     MONGO_DBNAME = os.environ.get("MONGO_DB", "ticketing_db")
     WTF_CSRF_TIME_LIMIT = None
     ADMIN_SECRET = os.environ.get("ADMIN_SECRET")
+    # taille maximale d'une requête (rechargements CSV de l'admin): 413 au-delà
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_UPLOAD_MB", 16)) * 1024 * 1024
+    # historique des tickets (écriture asynchrone par lots)
+    AUDIT_QUEUE_MAX = int(os.environ.get("AUDIT_QUEUE_MAX", 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 200))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 2.0))
+    # compression des réponses (brotli si le module est installé, sinon gzip)
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+    COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", 6))
+    COMPRESS_BR_QUALITY = int(os.environ.get("COMPRESS_BR_QUALITY", 4))
+    # tâches de fond (rapports XLSX)
+    JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 2))
+    JOBS_DIR = os.environ.get("JOBS_DIR")
+    JOBS_TTL_HOURS = float(os.environ.get("JOBS_TTL_HOURS", 24))
+    JOBS_STALE_MINUTES = float(os.environ.get("JOBS_STALE_MINUTES", 10))
+    # client Mongo dédié aux analytics (pool séparé, budget de temps par agrégation)
+    ANALYTICS_MONGO_URI = os.environ.get("ANALYTICS_MONGO_URI")  # défaut: MONGO_URI
+    ANALYTICS_POOL_SIZE = int(os.environ.get("ANALYTICS_POOL_SIZE", 10))
+    ANALYTICS_READ_PREFERENCE = os.environ.get("ANALYTICS_READ_PREFERENCE", "primaryPreferred")
+    ANALYTICS_MAX_TIME_MS = int(os.environ.get("ANALYTICS_MAX_TIME_MS", 5000))
+    ANALYTICS_ALLOW_DISK_USE = os.environ.get("ANALYTICS_ALLOW_DISK_USE", "1") == "1"
+    ANALYTICS_STALE_MAX = int(os.environ.get("ANALYTICS_STALE_MAX", 256))
+    # /analytics/api/dashboard: agrégations en parallèle sur une boucle asyncio par worker
+    ANALYTICS_ASYNC = os.environ.get("ANALYTICS_ASYNC", "1") == "1"
+    ANALYTICS_ASYNC_CONCURRENCY = int(os.environ.get("ANALYTICS_ASYNC_CONCURRENCY", 6))
+    # threads par worker gunicorn (Procfile: --threads $WEB_THREADS)
+    WEB_THREADS = int(os.environ.get("WEB_THREADS", 8))
+    # dashboard en direct (SSE): chaque flux occupe un thread du worker
+    LIVE_CAPPED_BYTES = int(os.environ.get("LIVE_CAPPED_BYTES", 1 << 20))
+    LIVE_QUEUE_MAX = int(os.environ.get("LIVE_QUEUE_MAX", 200))
+    LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", max(1, WEB_THREADS // 4)))
+    LIVE_MAX_PER_USER = int(os.environ.get("LIVE_MAX_PER_USER", 1))
+    LIVE_RESYNC_SECONDS = int(os.environ.get("LIVE_RESYNC_SECONDS", 30))
+    LIVE_KEEPALIVE_SECONDS = int(os.environ.get("LIVE_KEEPALIVE_SECONDS", 15))
+    LIVE_MAX_SECONDS = int(os.environ.get("LIVE_MAX_SECONDS", 300))
+    # clients / commandes récurrents (count-min sketch + top-K)
+    REPEAT_SKETCH_WIDTH = int(os.environ.get("REPEAT_SKETCH_WIDTH", 2048))
+    REPEAT_SKETCH_DEPTH = int(os.environ.get("REPEAT_SKETCH_DEPTH", 4))
+    REPEAT_TOP_K = int(os.environ.get("REPEAT_TOP_K", 50))
+    REPEAT_FLUSH_INTERVAL = float(os.environ.get("REPEAT_FLUSH_INTERVAL", 30.0))
+    # catalogue des options de filtres: reconstruction complète au-delà de cet âge
+    CATALOG_COMPACT_HOURS = float(os.environ.get("CATALOG_COMPACT_HOURS", 24))
@@ -1,5 +1,17 @@
 from flask_pymongo import PyMongo
 from flask_wtf.csrf import CSRFProtect
+from .utils.audit import AuditWriter
+from .utils.http import Compress
+from .utils.jobs import JobRunner
+from .utils.analytics_db import AnalyticsClient
+from .utils.live import LiveHub
+from .utils.repeats import RepeatTracker
 
 mongo = PyMongo()
-csrf = CSRFProtect()
\ No newline at end of file
+csrf = CSRFProtect()
+audit = AuditWriter()
+compress = Compress()
+jobs = JobRunner()
+analytics_db = AnalyticsClient()
+live = LiveHub()
+repeats = RepeatTracker()
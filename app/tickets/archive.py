@@ -0,0 +1,104 @@
+# app/tickets/archive.py
+"""
+Hot/cold split of the tickets: closed tickets older than N months move to
+'tickets_archive' (partition key 'archive_month' = YYYY-MM of the closing date).
+counters.archive.cutoff records that nothing closed after it is archived, so
+readers only touch the archive when their date range reaches before it.
+"""
+import time
+from datetime import datetime, timedelta
+from pymongo import DeleteMany, ReplaceOne, ReturnDocument
+from ..utils.http import bump_data_version
+from .rows import canon_statut, parse_date
+
+ARCHIVE = "tickets_archive"
+STATE_ID = "archive"
+CUTOFF_TTL = 60  # s, per-process cache of the cutoff
+
+_cache = {"at": 0.0, "cutoff": None}
+
+def archive_cutoff(db):
+    """datetime before which closed tickets may live in the archive (None: never archived)."""
+    now = time.monotonic()
+    if now - _cache["at"] > CUTOFF_TTL:
+        doc = db["counters"].find_one({"_id": STATE_ID}) or {}
+        _cache.update(at=now, cutoff=doc.get("cutoff"))
+    return _cache["cutoff"]
+
+def needs_cold(db, date_from=None, statut=None, default=True):
+    """
+    Should a read include the archive?
+    Only closed tickets are archived, and all of them were created before the cutoff.
+    """
+    cutoff = archive_cutoff(db)
+    if cutoff is None:
+        return False
+    if statut and canon_statut(statut) != "Clôturé":
+        return False
+    if date_from:
+        d = parse_date(date_from)
+        return d is None or d < cutoff
+    return default
+
+def union_cold(pipeline=None):
+    """$unionWith stage appending the archive (same pipeline applied to it)."""
+    stage = {"coll": ARCHIVE}
+    if pipeline:
+        stage["pipeline"] = pipeline
+    return {"$unionWith": stage}
+
+def find_in_archive(db, ticket_id):
+    return db[ARCHIVE].find_one({"id": ticket_id}, {"_id": 0, "archive_month": 0, "archived_at": 0})
+
+def restore_ticket(db, ticket_id):
+    """Move one archived ticket back to the hot collection (e.g. before editing it)."""
+    doc = db[ARCHIVE].find_one({"id": ticket_id}, {"_id": 0, "archive_month": 0, "archived_at": 0})
+    if doc is None:
+        return False
+    db["tickets"].replace_one({"id": ticket_id}, doc, upsert=True)
+    db[ARCHIVE].delete_one({"id": ticket_id})
+    return True
+
+def archive_closed(db, months=6, batch_size=500, echo=print):
+    """
+    Move closed tickets whose date_cloture is older than `months` months.
+    Each batch is upserted into the archive and only then deleted from the hot
+    collection, so an interrupted run can simply be restarted.
+    """
+    cutoff = datetime.now() - timedelta(days=30 * months)
+    db[ARCHIVE].create_index("id", unique=True)
+    db[ARCHIVE].create_index([("archive_month", 1), ("date_creation", 1)])
+    # recorded first, then every worker's cached cutoff (CUTOFF_TTL) must expire
+    # before anything moves, so readers include the archive by then
+    before = db["counters"].find_one_and_update(
+        {"_id": STATE_ID}, {"$max": {"cutoff": cutoff}}, upsert=True,
+        projection={"cutoff": 1}, return_document=ReturnDocument.BEFORE) or {}
+    _cache["at"] = 0.0
+    if before.get("cutoff") is None or before["cutoff"] < cutoff:
+        echo(f"  cutoff {cutoff:%Y-%m-%d} enregistré, attente de {CUTOFF_TTL}s (cache des workers)")
+        time.sleep(CUTOFF_TTL)
+
+    candidates = []
+    for r in db["tickets"].find({"date_cloture": {"$nin": ["", None]}}, {"_id": 0, "id": 1, "statut": 1, "date_cloture": 1}):
+        dc = parse_date(r.get("date_cloture"))
+        if dc is not None and dc < cutoff and canon_statut(r.get("statut")) == "Clôturé":
+            candidates.append(r["id"])
+
+    moved = 0
+    for start in range(0, len(candidates), batch_size):
+        ids = candidates[start:start + batch_size]
+        docs = list(db["tickets"].find({"id": {"$in": ids}}, {"_id": 0}))
+        now = datetime.now()
+        ops = []
+        for d in docs:
+            month = parse_date(d.get("date_cloture")).strftime("%Y-%m")
+            ops.append(ReplaceOne({"id": d["id"]}, {**d, "archive_month": month, "archived_at": now}, upsert=True))
+        if ops:
+            db[ARCHIVE].bulk_write(ops, ordered=False)
+            db["tickets"].bulk_write([DeleteMany({"id": {"$in": [d["id"] for d in docs]}})])
+            bump_data_version(db)  # cached list/analytics responses still hold the moved rows
+        moved += len(docs)
+        echo(f"  {moved}/{len(candidates)} tickets archivés")
+
+    db["counters"].update_one({"_id": STATE_ID}, {"$inc": {"moved": moved}, "$set": {"last_run": datetime.now()}})
+    return {"cutoff": cutoff, "candidates": len(candidates), "moved": moved}
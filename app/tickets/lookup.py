@@ -0,0 +1,104 @@
+# app/tickets/lookup.py
+"""
+Search-as-you-type on the ticket identifiers (id, num_cmd, id_client):
+anchored prefix regexes, one index range scan per field, small projection.
+Archived tickets are only read when the hot collection leaves room.
+The same indexes serve the exact repeat check of the ticket form.
+"""
+import re
+from .archive import ARCHIVE
+
+LOOKUP_FIELDS = ("id", "num_cmd", "id_client")
+LOOKUP_PROJECTION = {"_id": 0, "id": 1, "num_cmd": 1, "id_client": 1, "nom_prenom": 1,
+                     "statut": 1, "date_creation": 1, "magasin": 1}
+LOOKUP_LIMIT = 20
+MIN_CHARS = 2
+REPEAT_LIMIT = 5
+# exact identifier checks ignore case (strength 2) through a matching index
+LOOKUP_COLLATION = {"locale": "fr", "strength": 2}
+
+_indexed = set()
+
+def ensure_lookup_indexes(db):
+    """
+    One ascending index per identifier (the id one already exists, unique),
+    plus a case-insensitive one for the exact repeat checks.
+    """
+    if db.name in _indexed:
+        return
+    for src in ("tickets", ARCHIVE):
+        for field in LOOKUP_FIELDS[1:]:
+            db[src].create_index(field)
+            db[src].create_index(field, name=f"{field}_ci", collation=LOOKUP_COLLATION)
+    _indexed.add(db.name)
+
+def _number(v):
+    # legacy imports stored some num_cmd / id_client as numbers
+    return int(v) if v.isascii() and v.isdigit() and len(v) <= 18 else None
+
+def id_variants(value):
+    """
+    Values an identifier is matched against (with LOOKUP_COLLATION, so any
+    case): the trimmed string, and the number for all-digit values.
+    """
+    v = str(value or "").strip()
+    if not v:
+        return []
+    n = _number(v)
+    return [v] + ([n] if n is not None else [])
+
+def _prefix(q):
+    # case-sensitive and anchored: the planner turns it into index bounds, so
+    # only q / q.upper() / q.lower() are tried; a numeric q also matches the
+    # legacy numeric values exactly (a regex never matches a number)
+    variants = dict.fromkeys([q, q.upper(), q.lower()])
+    n = _number(q)
+    return {"$in": [re.compile("^" + re.escape(v)) for v in variants] + ([n] if n is not None else [])}
+
+def lookup_tickets(db, q, limit=LOOKUP_LIMIT):
+    """Top tickets whose id, num_cmd or id_client starts with q; exact matches first."""
+    q = (q or "").strip()
+    if len(q) < MIN_CHARS:
+        return []
+    ensure_lookup_indexes(db)
+    cond = _prefix(q)
+    hits = {}
+    for src in ("tickets", ARCHIVE):
+        for field in LOOKUP_FIELDS:
+            if len(hits) >= limit:
+                break
+            for doc in db[src].find({field: cond}, LOOKUP_PROJECTION).sort(field, 1).limit(limit):
+                key = str(doc.get("id"))
+                if key not in hits:
+                    doc["match"] = field
+                    doc["archived"] = src == ARCHIVE
+                    hits[key] = doc
+    ql = q.lower()
+    # stable: exact identifier first, then field order (id, num_cmd, id_client)
+    rows = sorted(hits.values(), key=lambda d: str(d.get(d["match"], "")).lower() != ql)
+    return rows[:limit]
+
+def prior_tickets(db, values, exclude=None, limit=REPEAT_LIMIT):
+    """
+    Exact repeat check for the ticket form: {field: {count, tickets}} per
+    identifier given (num_cmd / id_client), most recent first, archive included.
+    """
+    ensure_lookup_indexes(db)
+    out = {}
+    for field, value in values.items():
+        variants = id_variants(value)
+        if field not in LOOKUP_FIELDS[1:] or not variants:
+            continue
+        cond = {field: {"$in": variants}}
+        if exclude:
+            cond["id"] = {"$ne": exclude}
+        count, tickets = 0, []
+        for src in ("tickets", ARCHIVE):
+            count += db[src].count_documents(cond, collation=LOOKUP_COLLATION)
+            if len(tickets) < limit:
+                cur = db[src].find(cond, LOOKUP_PROJECTION, collation=LOOKUP_COLLATION)
+                for doc in cur.sort("date_creation", -1).limit(limit - len(tickets)):
+                    doc["archived"] = src == ARCHIVE
+                    tickets.append(doc)
+        out[field] = {"count": count, "tickets": tickets}
+    return out
@@ -0,0 +1,120 @@
+# app/tickets/queue.py
+"""
+"Ma file": the agent's open / in-progress tickets, oldest first, read with
+keyset pagination on the (agent, statut, date_creation, id) index, so the
+next page is an index seek whatever the size of the closed history.
+
+The keyset compares date_creation as strings, which only orders the app's
+own "YYYY-mm-dd HH:MM:SS" values: rows stored otherwise (French dates of old
+imports, BSON dates) are left out of the pages and counted as "unsorted"
+until `flask tickets normalize-dates` rewrites them.
+"""
+import base64
+import binascii
+import json
+import re
+from datetime import datetime
+from pymongo import UpdateOne
+from .rows import canon_statut, format_date, parse_date
+from .statut import statut_match
+
+QUEUE_STATUTS = ("Ouvert", "En cours")
+QUEUE_INDEX = [("agent", 1), ("statut", 1), ("date_creation", 1), ("id", 1)]
+QUEUE_INDEX_NAME = "agent_statut_date_id"
+QUEUE_FIELDS = ["id", "date_creation", "statut", "nom_prenom", "thematique", "magasin", "num_cmd", "canal"]
+MAX_PAGE = 200
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?$")
+
+_indexed = set()
+
+def ensure_queue_index(db):
+    """Create the queue index once per process and database."""
+    if db.name not in _indexed:
+        db["tickets"].create_index(QUEUE_INDEX, name=QUEUE_INDEX_NAME)
+        _indexed.add(db.name)
+
+def encode_cursor(doc):
+    raw = json.dumps([doc.get("date_creation"), doc.get("id")]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token):
+    """(date_creation, id) or None for an invalid token (no operator reaches the query)."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        date, tid = json.loads(raw)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    # ids are strings, or ints for legacy tickets not migrated yet
+    if not (isinstance(date, str) and ISO_DATE.match(date)
+            and isinstance(tid, (str, int)) and not isinstance(tid, bool)):
+        return None
+    return date, tid
+
+def _age(seconds):
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    if days:
+        return f"{days} j {hours} h"
+    return f"{hours} h {rest // 60:02d}" if hours else f"{rest // 60} min"
+
+def queue_page(db, agent, limit=50, after=None):
+    """One page of the agent's queue: {items, next, counts, total, unsorted}."""
+    ensure_queue_index(db)
+    base = {"agent": agent, "statut": statut_match(db, QUEUE_STATUTS)}
+    q = {**base, "date_creation": ISO_DATE}
+    if after:
+        date, tid = after
+        q["$or"] = [{"date_creation": {"$gt": date}}, {"date_creation": date, "id": {"$gt": tid}}]
+    docs = list(db["tickets"].find(q, {"_id": 0, **{f: 1 for f in QUEUE_FIELDS}})
+                .sort([("date_creation", 1), ("id", 1)])
+                .hint(QUEUE_INDEX_NAME)
+                .limit(limit + 1))
+    more = len(docs) > limit
+    docs = docs[:limit]
+
+    now = datetime.now()
+    items = []
+    for d in docs:
+        dc = parse_date(d.get("date_creation"))
+        age = (now - dc).total_seconds() if dc else None
+        items.append({
+            "id": str(d.get("id", "")),
+            "date_creation": format_date(dc),
+            "age_s": int(age) if age is not None else None,
+            "age": _age(age) if age is not None and age >= 0 else "",
+            "statut": canon_statut(d.get("statut")),
+            **{f: d.get(f) or "" for f in ("nom_prenom", "thematique", "magasin", "num_cmd", "canal")},
+        })
+
+    # counts per statut: covered by the index prefix (agent, statut)
+    counts = dict.fromkeys(QUEUE_STATUTS, 0)
+    for r in db["tickets"].aggregate([{"$match": base}, {"$group": {"_id": "$statut", "n": {"$sum": 1}}}]):
+        counts[canon_statut(r["_id"])] = counts.get(canon_statut(r["_id"]), 0) + r["n"]
+
+    return {
+        "items": items,
+        "next": encode_cursor(docs[-1]) if more else None,
+        "counts": counts,
+        "total": sum(counts.values()),
+        "unsorted": db["tickets"].count_documents({**base, "date_creation": {"$not": ISO_DATE}}),
+    }
+
+def normalize_dates(db, coll="tickets", batch_size=500, echo=print):
+    """Rewrite every parseable date_creation not in DATE_FORMAT; returns (fixed, unparseable)."""
+    fixed, bad, ops = 0, 0, []
+    strict = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+    for d in db[coll].find({"date_creation": {"$not": strict}}, {"_id": 1, "date_creation": 1}):
+        dt = parse_date(d.get("date_creation"))
+        if dt is None:
+            bad += 1
+            continue
+        ops.append(UpdateOne({"_id": d["_id"], "date_creation": d.get("date_creation")},
+                             {"$set": {"date_creation": dt.strftime(DATE_FORMAT)}}))
+        if len(ops) >= batch_size:
+            fixed += db[coll].bulk_write(ops, ordered=False).modified_count
+            ops = []
+            echo(f"{coll}: {fixed} dates réécrites")
+    if ops:
+        fixed += db[coll].bulk_write(ops, ordered=False).modified_count
+    return fixed, bad
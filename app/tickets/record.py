@@ -0,0 +1,126 @@
+# app/tickets/record.py
+"""
+TicketRecord: one ticket as a __slots__ object, with the form parsing,
+Mongo encoding/decoding and CSV/XLSX row serialization in one place.
+The codec table is built once at import. Records always carry every
+field: reads that need only a few columns (list, close) use their own
+projections on plain dicts.
+"""
+from .rows import canon_statut
+
+def _text(v) -> str:
+    return str(v) if v is not None else ""
+
+def _stripped(v) -> str:
+    return _text(v).strip()
+
+def _amount(v) -> float:
+    try:
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+# (champ, lecture du formulaire, valeur par défaut) — dans l'ordre des colonnes CSV.
+# None: champ non saisi dans le formulaire (fixé par la route).
+FIELD_CODECS = (
+    ("id", None, ""),
+    ("date_creation", None, ""),
+    ("agent", None, ""),
+    ("nom_prenom", _stripped, ""),
+    ("id_client", _stripped, ""),
+    ("num_cmd", _stripped, ""),
+    ("canal", _text, ""),
+    ("thematique", _text, ""),
+    ("famille", _text, ""),
+    ("sous_famille", _text, ""),
+    ("categorie", _text, ""),
+    ("sous_categorie", _text, ""),
+    ("action", _text, ""),
+    ("traitement", _text, "Normal"),
+    ("si_exceptionnel", _stripped, ""),
+    ("code_promo", _stripped, ""),
+    ("prix_pdts", _amount, 0.0),
+    ("mnt_commande", _amount, 0.0),
+    ("mnt_rembour", _amount, 0.0),
+    ("mnt_gestco", _amount, 0.0),
+    ("total_code_promo", None, 0.0),
+    ("retour_magasin", _stripped, ""),
+    ("commentaires", _stripped, ""),
+    ("date_cloture", None, ""),
+    ("cloture_by", None, ""),
+    ("statut", canon_statut, "Ouvert"),
+    ("magasin", _stripped, ""),
+    ("num_magasin", _stripped, ""),
+    ("ville", _stripped, ""),
+    ("bu", _stripped, ""),
+    ("region", _stripped, ""),
+    ("dr", _stripped, ""),
+    ("dm", _stripped, ""),
+)
+FIELDS = tuple(name for name, _, _ in FIELD_CODECS)
+DEFAULTS = {name: default for name, _, default in FIELD_CODECS}
+_FORM_CODECS = tuple((name, parse, default) for name, parse, default in FIELD_CODECS if parse)
+
+REQUIRED = (("nom_prenom", "Nom et Prénom client"), ("canal", "Canal"), ("statut", "Statut"))
+TAXONOMY = ("thematique", "famille", "sous_famille", "categorie", "sous_categorie", "action")
+
+class TicketRecord:
+    __slots__ = FIELDS + ("version",)
+
+    def __init__(self, **values):
+        for name in FIELDS:
+            setattr(self, name, values.get(name, DEFAULTS[name]))
+        self.version = values.get("version", 0)
+
+    # ---------- formulaire ----------
+
+    @staticmethod
+    def form_values(form):
+        """Parsed values of every field the ticket form posts (+ total_code_promo)."""
+        out = {name: parse(form.get(name, default)) for name, parse, default in _FORM_CODECS}
+        out["total_code_promo"] = out["mnt_rembour"] + out["mnt_gestco"]
+        return out
+
+    @staticmethod
+    def parse_fields(values, fields):
+        """Parsed values of the given form fields present in values (quick edit)."""
+        return {name: parse(values[name]) for name, parse, _ in _FORM_CODECS if name in fields and name in values}
+
+    @staticmethod
+    def missing_fields(form):
+        """Labels of the required form fields left empty."""
+        missing = [label for name, label in REQUIRED if not form.get(name, "").strip()]
+        if form.get("traitement") == "Exceptionnel" and not form.get("si_exceptionnel", "").strip():
+            missing.append("Motif pour traitement exceptionnel")
+        missing += [k.replace("_", " ").title() for k in TAXONOMY if not form.get(k, "").strip()]
+        return missing
+
+    @classmethod
+    def from_form(cls, form, **fixed):
+        """New ticket from the form; fixed: the fields the route sets (id, agent, dates...)."""
+        return cls(**{**cls.form_values(form), **fixed})
+
+    # ---------- Mongo ----------
+
+    @staticmethod
+    def projection():
+        return {"_id": 0, **{f: 1 for f in FIELDS}}
+
+    @classmethod
+    def from_mongo(cls, doc):
+        """Record from a stored document (missing fields take their default)."""
+        rec = cls.__new__(cls)
+        for name in FIELDS:
+            setattr(rec, name, doc.get(name, DEFAULTS[name]))
+        rec.version = doc.get("version", 0)
+        return rec
+
+    def to_mongo(self):
+        """Document for insert/replace, in column order."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    # ---------- exports ----------
+
+    def to_row(self):
+        """Values in column order (CSV/XLSX)."""
+        return [getattr(self, name) for name in FIELDS]
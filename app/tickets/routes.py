@@ -1,47 +1,27 @@
 # app/tickets/routes.py
-from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, send_file, g
-from ..extensions import mongo
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify, g
+from ..extensions import mongo, audit, repeats
+from ..utils.audit import field_changes
+from ..utils.repeats import REPEAT_DIMS
+from ..utils.http import bump_data_version, conditional_get
 from datetime import datetime
+import csv
 import io
-import pandas as pd
-from pymongo import ReturnDocument
+import click
+from pymongo import ReturnDocument, UpdateOne
+from .record import FIELDS, TicketRecord
+from .rows import LIST_PROJECTION, canon_statut, format_date, format_list_row, normalize_thematiques_rows, parse_date, prepare_list_rows
+from .stores import MAX_LIMIT, store_index
+from ..analytics.catalog import catalog_add
+from ..analytics.live import DIM_FIELDS, publish_resync, publish_ticket_change
+from .archive import ARCHIVE, archive_closed, find_in_archive, needs_cold, restore_ticket
+from .queue import MAX_PAGE, decode_cursor, normalize_dates, queue_page
+from .lookup import LOOKUP_LIMIT, lookup_tickets, prior_tickets
+from .statut import CLOSED, canonicalize_statuts, statut_match, rebuild_statut_counts, statut_counts, statut_moved, statut_moved_many
 
 tickets_bp = Blueprint("tickets", __name__, template_folder="../templates")
 
-EXPECTED_HEADERS = [
-    'id','date_creation','agent','nom_prenom','id_client','num_cmd','canal',
-    'thematique','famille','sous_famille','categorie','sous_categorie','action',
-    'traitement','si_exceptionnel','code_promo','prix_pdts','mnt_commande','mnt_rembour',
-    'mnt_gestco','total_code_promo','retour_magasin','commentaires',
-    'date_cloture','cloture_by','statut','magasin','num_magasin','ville','bu','region','dr','dm'
-]
-
-import unicodedata
-
-def _strip_accents(s: str) -> str:
-    return ''.join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
-
-STATUT_MAP = {
-    "ouvert": "Ouvert",
-    "open": "Ouvert",
-    "en cours": "En cours",
-    "en traitement": "En cours",
-    "cloture": "Clôturé",
-    "cloture ": "Clôturé",
-    "cloturee": "Clôturé",
-    "cloturé": "Clôturé",  # handles weird unicode
-    "cloturé": "Clôturé",
-    "cloturee ": "Clôturé",
-    "resolu": "Résolu",
-    "resolve": "Résolu",
-    "resolue": "Résolu",
-    "resolue ": "Résolu",
-}
-
-def canon_statut(x):
-    s = str(x or "").strip()
-    key = _strip_accents(s).lower()
-    return STATUT_MAP.get(key, s)  # default to original if unknown
+EXPECTED_HEADERS = list(FIELDS)
 
 def _db():
     return mongo.cx.get_database(current_app.config["MONGO_DBNAME"])
@@ -105,80 +85,110 @@ def next_ticket_id() -> str:
     )
     return str(res["seq"])
 
-def _find_ticket_by_id(id_value: str):
-    ors = [{"id": str(id_value)}]
+def canon_ticket_id(v) -> str:
+    """Canonical stored form of a ticket id: 547, '547', '547.0' -> '547'."""
+    n = _numeric_id(v)
+    return str(n) if n is not None else str(v).strip()
+
+def _find_ticket_by_id(id_value: str, with_archive=True):
+    """Hot collection first, then the archive (archived docs carry '_archived': True)."""
+    doc = coll("tickets").find_one({"id": canon_ticket_id(id_value)}, {"_id": 0})
+    nid = _numeric_id(id_value)
+    if doc is None and nid is not None:
+        # legacy int id, not migrated yet (flask tickets migrate-ids)
+        doc = coll("tickets").find_one({"id": nid}, {"_id": 0})
+    if doc is None and with_archive:
+        doc = find_in_archive(_db(), canon_ticket_id(id_value))
+        if doc is not None:
+            doc["_archived"] = True
+    return doc
+
+def _id_match(id_value):
+    """Condition on 'id' for writes: canonical string, or the legacy int id (before migrate-ids)."""
     nid = _numeric_id(id_value)
-    if nid is not None:
-        ors.append({"id": nid})
-    return coll("tickets").find_one({"$or": ors}, {"_id": 0})
-
-# put this near the top of routes.py
-import pandas as pd
-import numpy as np
-
-NULLY = {"", "None", "none", "nan", "NaN", "_", "-"}
-
-def parse_date_creation(series):
-    s = pd.Series(series, dtype="string").str.strip()
-    s = s.where(~s.isin(NULLY), pd.NA)
-
-    # Pass 1: your app's ISO strings (no dayfirst here!)
-    dc = pd.to_datetime(s, format="%Y-%m-%d %H:%M:%S", errors="coerce")
-
-    # Pass 2: fallback for FR strings like 'dd/mm/YYYY HH:MM' (use dayfirst)
-    m = dc.isna()
-    if m.any():
-        dc.loc[m] = pd.to_datetime(s[m], format="%d/%m/%Y %H:%M", errors="coerce", dayfirst=True)
-
-    # Last chance: free parse for any leftovers
-    m = dc.isna()
-    if m.any():
-        dc.loc[m] = pd.to_datetime(s[m], errors="coerce", dayfirst=True)
-
-    return dc
-
-def _slug_col(name: str) -> str:
-    import unicodedata, re
-    s = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
-    s = re.sub(r"\s+", " ", s.strip()).lower()
-    return s
-
-CANON_MAP = {
-    "thematique": "Thematique",
-    "famille": "Famille",
-    "sous famille": "Sous Famille",
-    "sous_famille": "Sous Famille",
-    "categorie": "Categorie",
-    "catégorie": "Categorie",
-    "sous categorie": "Sous Categorie",
-    "sous catégorie": "Sous Categorie",
-    "actions": "Action",
-    "action": "Action",
-}
+    return {"$in": [canon_ticket_id(id_value)] + ([nid] if nid is not None else [])}
+
+def _version_filter(v):
+    """
+    Match the version the form was loaded with (tickets without 'version' count
+    as 0). None when it is not a number (tampered form): callers treat it as a conflict.
+    """
+    try:
+        v = int(v or 0)
+    except (TypeError, ValueError):
+        return None
+    return {"version": {"$in": [0, None]}} if v == 0 else {"version": v}
+
+@tickets_bp.cli.command("migrate-ids")
+def migrate_ids():
+    """Rewrite every ticket id to its canonical string form and add a version field."""
+    tickets = coll("tickets")
+    rows = list(tickets.find({}, {"_id": 1, "id": 1, "version": 1}))
+    owners = {}
+    for r in rows:
+        owners.setdefault(canon_ticket_id(r.get("id")), []).append(r["_id"])
+
+    ops, conflicts = [], []
+    for r in rows:
+        cid = canon_ticket_id(r.get("id"))
+        if len(owners[cid]) > 1:
+            conflicts.append(cid)
+            continue
+        sets = {}
+        if r.get("id") != cid:
+            sets["id"] = cid
+        if "version" not in r:
+            sets["version"] = 0
+        if sets:
+            ops.append(UpdateOne({"_id": r["_id"]}, {"$set": sets}))
+
+    modified = 0
+    for start in range(0, len(ops), 1000):
+        modified += tickets.bulk_write(ops[start:start + 1000], ordered=False).modified_count
+    tickets.create_index("id", unique=True)
+    click.echo(f"{len(rows)} tickets, {modified} modifiés, {len(set(conflicts))} ids en doublon ignorés")
+    for cid in sorted(set(conflicts)):
+        click.echo(f"  doublon: {cid}")
+
+@tickets_bp.cli.command("canon-statut")
+@click.option("--workers", default=4, show_default=True, help="mises à jour en parallèle")
+def canon_statut_cmd(workers):
+    """Store every statut in its canonical form and recount counters.statut."""
+    modified = canonicalize_statuts(_db(), workers, echo=click.echo)
+    bump_data_version(_db())
+    counts = statut_counts(_db())
+    click.echo(f"{modified} tickets corrigés; " + ", ".join(f"{k}: {n}" for k, n in counts.items()))
+
+@tickets_bp.cli.command("normalize-dates")
+def normalize_dates_cmd():
+    """Store every date_creation as 'YYYY-mm-dd HH:MM:SS' (the queue keyset needs it)."""
+    for src in ("tickets", ARCHIVE):
+        fixed, bad = normalize_dates(_db(), src, echo=click.echo)
+        click.echo(f"{src}: {fixed} dates normalisées, {bad} illisibles")
+    bump_data_version(_db())
+
+@tickets_bp.cli.command("recount-statut")
+def recount_statut_cmd():
+    """Recount counters.statut from the tickets (once after deploy, or to repair it)."""
+    counts = rebuild_statut_counts(_db())
+    click.echo(", ".join(f"{k}: {n}" for k, n in counts.items()) or "aucun ticket")
+
+@tickets_bp.cli.command("rebuild-repeats")
+def rebuild_repeats_cmd():
+    """Recount the repeat-contact sketches (id_client, num_cmd) from every ticket."""
+    n = repeats.rebuild(_db(), ("tickets", ARCHIVE), echo=click.echo)
+    click.echo(f"{n} tickets comptés")
+
+@tickets_bp.cli.command("archive")
+@click.option("--months", default=6, show_default=True, help="Ancienneté minimale de la clôture.")
+@click.option("--batch", default=500, show_default=True, help="Tickets déplacés par lot.")
+def archive_tickets(months, batch):
+    """Move tickets closed more than N months ago to tickets_archive (resumable)."""
+    stats = archive_closed(_db(), months=months, batch_size=batch, echo=click.echo)
+    click.echo(f"cutoff {stats['cutoff']:%Y-%m-%d}: {stats['moved']}/{stats['candidates']} tickets archivés")
 
 def _normalize_thematiques_columns(rows):
-    import pandas as pd, unicodedata
-    if not rows:
-        return []
-    df = pd.DataFrame(rows).fillna("")
-    # rename headers to canonical
-    rename_dict = {}
-    for c in df.columns:
-        slug = _slug_col(c)
-        if slug in CANON_MAP:
-            rename_dict[c] = CANON_MAP[slug]
-    df = df.rename(columns=rename_dict)
-    # ensure columns exist
-    for col in ["Thematique", "Famille", "Sous Famille", "Categorie", "Sous Categorie", "Action"]:
-        if col not in df.columns:
-            df[col] = ""
-    # normalize values
-    def _canon_val(x: str) -> str:
-        s = unicodedata.normalize("NFKC", str(x))
-        return s.strip()
-    for col in ["Thematique", "Famille", "Sous Famille", "Categorie", "Sous Categorie", "Action"]:
-        df[col] = df[col].astype(str).map(_canon_val)
-    return df.astype(str).to_dict(orient="records")
+    return normalize_thematiques_rows(rows)
 
 # ---------- APIs used by forms ----------
 
@@ -201,6 +211,38 @@ def api_magasins():
     data.sort(key=lambda x: x["label"])
     return jsonify(data)
 
+@tickets_bp.get("/api/magasins/search")
+def api_magasins_search():
+    """Typeahead: top-N stores matching q (accent-insensitive, name/code/ville)."""
+    q = request.args.get("q", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), MAX_LIMIT))
+    except ValueError:
+        limit = 20
+    return jsonify(store_index(_db()).search(q, limit))
+
+@tickets_bp.get("/api/lookup")
+def api_lookup():
+    """Search-as-you-type: tickets whose id, num_cmd or id_client starts with q."""
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    rows = lookup_tickets(_db(), request.args.get("q", ""), LOOKUP_LIMIT)
+    for r in rows:
+        r["date_creation"] = format_date(parse_date(r.get("date_creation")))
+    return jsonify(rows)
+
+@tickets_bp.get("/api/repeats")
+def api_repeats():
+    """Prior tickets of the client / order typed in the form (exact, indexed) + sketch estimate."""
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    out = prior_tickets(_db(), {f: request.args.get(f) for f in REPEAT_DIMS}, exclude=request.args.get("exclude"))
+    for dim, hit in out.items():
+        hit["estimate"] = repeats.estimate(dim, request.args.get(dim))
+        for r in hit["tickets"]:
+            r["date_creation"] = format_date(parse_date(r.get("date_creation")))
+    return jsonify(out)
+
 @tickets_bp.get("/api/thematiques")
 def api_thematiques_root():
     rows = list(coll("thematiques").find({}, {"_id":0}))
@@ -249,6 +291,7 @@ def api_thematiques_children():
 # ---------- Views ----------
 
 @tickets_bp.route("/list")
+@conditional_get(_db)
 def list_tickets():
     ru = require_user()
     if ru: return ru
@@ -263,85 +306,46 @@ def list_tickets():
     dmax = request.args.get("dmax")
 
     if agent: q["agent"] = agent
-    if statut: q["statut"] = statut
+    if statut: q["statut"] = statut_match(_db(), [statut])
     if thematique: q["thematique"] = thematique
     if magasin: q["magasin"] = magasin
 
-    rows = list(coll("tickets").find(q, {"_id":0}))
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return render_template("tickets_list.html", rows=[], agents=[], statuts=[], thems=[], magasins=[], search=search)
-
-    if dmin or dmax:
-        dc = parse_date_creation(df.get("date_creation"))
-        df["date_creation"] = dc
-        if dmin:
-            df = df[df["date_creation"].dt.date >= pd.to_datetime(dmin).date()]
-        if dmax:
-            df = df[df["date_creation"].dt.date <= pd.to_datetime(dmax).date()]
-
-    if search:
-        t = search
-        for col in ["nom_prenom","num_cmd","id_client","magasin","commentaires","id"]:
-            if col not in df.columns:
-                df[col] = ""
-        mask = (
-            df["nom_prenom"].astype(str).str.lower().str.contains(t, na=False) |
-            df["num_cmd"].astype(str).str.lower().str.contains(t, na=False)  |
-            df["id_client"].astype(str).str.lower().str.contains(t, na=False)|
-            df["magasin"].astype(str).str.lower().str.contains(t, na=False)  |
-            df["commentaires"].astype(str).str.lower().str.contains(t, na=False)|
-            df["id"].astype(str).str.lower().str.contains(t, na=False)
-        )
-        df = df[mask]
-
-    for col in ["agent","statut","thematique","magasin"]:
-        if col not in df.columns: df[col] = ""
-    agents   = sorted([x for x in df["agent"].dropna().unique().tolist() if str(x).strip()])
-    statuts  = sorted([x for x in df["statut"].dropna().unique().tolist() if str(x).strip()])
-    thems    = sorted([x for x in df["thematique"].dropna().unique().tolist() if str(x).strip()])
-    magasins = sorted([x for x in df["magasin"].dropna().unique().tolist() if str(x).strip()])
-
-    dc = parse_date_creation(df.get("date_creation"))
-    df["__dc"] = dc
-    df = df.sort_values(by="__dc", ascending=False, na_position="last").drop(columns=["__dc"])
-
-    display_cols = ["id","date_creation","agent","nom_prenom","magasin","thematique","statut","num_cmd","id_client"]
-    for c in display_cols:
-        if c not in df.columns: df[c] = ""
-
-    dc = parse_date_creation(df.get("date_creation"))
-    df["date_creation"] = dc.dt.strftime("%d/%m/%Y %H:%M").fillna("")
-
-    import numpy as np
-    MONEY_COLS = ["prix_pdts","mnt_commande","mnt_rembour","mnt_gestco","total_code_promo"]
-    for c in MONEY_COLS:
-        if c not in df.columns:
-            df[c] = 0
-        df[c] = pd.to_numeric(
-            df[c]
-            .astype(str)
-            .str.replace(',', '.', regex=False)                 # 12,3 -> 12.3
-            .str.replace(r'^\s*[_-]\s*$', '', regex=True)       # "_" or "-" -> ""
-            .replace({"None": "", "": np.nan}),
-            errors="coerce"
-        ).fillna(0.0)
-
-    for m in ["mnt_commande","total_code_promo"]:
-        df[m] = df[m].map(lambda v: f"{v:.2f} MAD")
-
-    for c in ["agent", "thematique", "magasin"]:
-        if c not in df.columns: df[c] = ""
-        df[c] = df[c].astype(str).str.strip()
-
-    if "statut" not in df.columns:
-        df["statut"] = ""
-    df["statut"] = df["statut"].map(canon_statut)
-    
-    rows = df[display_cols].to_dict(orient="records")
-    
+    archives = request.args.get("archives") == "1"
+    rows = list(coll("tickets").find(q, LIST_PROJECTION))
+    # archived (old closed) tickets only when asked for, when filtering on the
+    # closed statut (mostly archived), or when the date range reaches them
+    closed_only = bool(statut) and canon_statut(statut) == CLOSED
+    if needs_cold(_db(), dmin, statut, default=archives or closed_only):
+        rows += list(coll(ARCHIVE).find(q, LIST_PROJECTION))
+    if not rows:
+        return render_template("tickets_list.html", rows=[], agents=[], statuts=[], thems=[], magasins=[], search=search, archives=archives)
+
+    rows, agents, statuts, thems, magasins = prepare_list_rows(rows, dmin, dmax, search)
+
     return render_template("tickets_list.html",
-                           rows=rows, agents=agents, statuts=statuts, thems=thems, magasins=magasins, search=search)
+                           rows=rows, agents=agents, statuts=statuts, thems=thems, magasins=magasins, search=search, archives=archives)
+
+@tickets_bp.route("/queue")
+def my_queue():
+    ru = require_user()
+    if ru: return ru
+    return render_template("my_queue.html")
+
+@tickets_bp.get("/api/queue")
+def api_queue():
+    """Open / in-progress tickets of the current agent, oldest first; ?after=<next> for the next page."""
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), MAX_PAGE))
+    except ValueError:
+        return jsonify({"error": "limit invalide"}), 400
+    after = None
+    if request.args.get("after"):
+        after = decode_cursor(request.args["after"])
+        if after is None:
+            return jsonify({"error": "curseur invalide"}), 400
+    return jsonify(queue_page(_db(), g.user.get("username"), limit=limit, after=after))
 
 @tickets_bp.route("/create", methods=["GET","POST"])
 def create_ticket():
@@ -358,69 +362,74 @@ def create_ticket():
         f = request.form
 
         # validations
-        missing = []
-        if not f.get("nom_prenom","").strip(): missing.append("Nom et Prénom client")
-        if not f.get("canal",""): missing.append("Canal")
-        if not f.get("statut",""): missing.append("Statut")
-        if f.get("traitement") == "Exceptionnel" and not f.get("si_exceptionnel","").strip():
-            missing.append("Motif pour traitement exceptionnel")
-        for k in ["thematique","famille","sous_famille","categorie","sous_categorie","action"]:
-            if not f.get(k,"").strip(): missing.append(k.replace("_"," ").title())
-
+        missing = TicketRecord.missing_fields(f)
         if missing:
             flash("⚠️ Champs obligatoires manquants : " + ", ".join(missing), "danger")
             return render_template("ticket_form.html", mode="edit", vals=f, ticket_id=None, canaux=canaux, now=datetime.now())
 
         next_id = next_ticket_id()
-
-        def ffloat(x):
-            try: return float(x or 0)
-            except: return 0.0
-
-        now = datetime.now()
-        total_code_promo = ffloat(f.get("mnt_rembour")) + ffloat(f.get("mnt_gestco"))
-
-        doc = {
-            'id': next_id,
-            'date_creation': now.strftime("%Y-%m-%d %H:%M:%S"),
-            'agent': g.user.get("username"),
-            'nom_prenom': f.get("nom_prenom","").strip(),
-            'id_client': f.get("id_client","").strip(),
-            'num_cmd': f.get("num_cmd","").strip(),
-            'canal': f.get("canal",""),
-            'thematique': f.get("thematique",""),
-            'famille': f.get("famille",""),
-            'sous_famille': f.get("sous_famille",""),
-            'categorie': f.get("categorie",""),
-            'sous_categorie': f.get("sous_categorie",""),
-            'action': f.get("action",""),
-            'traitement': f.get("traitement","Normal"),
-            'si_exceptionnel': f.get("si_exceptionnel","").strip(),
-            'code_promo': f.get("code_promo","").strip(),
-            'prix_pdts': ffloat(f.get("prix_pdts")),
-            'mnt_commande': ffloat(f.get("mnt_commande")),
-            'mnt_rembour': ffloat(f.get("mnt_rembour")),
-            'mnt_gestco': ffloat(f.get("mnt_gestco")),
-            'total_code_promo': total_code_promo,
-            'retour_magasin': f.get("retour_magasin","").strip(),
-            'commentaires': f.get("commentaires","").strip(),
-            'date_cloture': "",
-            'cloture_by': "",
-            'statut': f.get("statut","Ouvert"),
-            'magasin': f.get("magasin","").strip(),
-            'num_magasin': f.get("num_magasin","").strip(),
-            'ville': f.get("ville","").strip(),
-            'bu': f.get("bu","").strip(),
-            'region': f.get("region","").strip(),
-            'dr': f.get("dr","").strip(),
-            'dm': f.get("dm","").strip(),
-        }
+        doc = TicketRecord.from_form(
+            f,
+            id=next_id,
+            date_creation=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            agent=g.user.get("username"),
+            version=0,
+        ).to_mongo()
         coll("tickets").insert_one(doc)
+        bump_data_version(_db())
+        audit.record(next_id, doc["agent"], "create")
+        statut_moved(_db(), None, doc["statut"])
+        publish_ticket_change(_db(), None, doc)
+        catalog_add(_db(), doc)
+        repeats.record(doc)
         flash(f"✅ Ticket {next_id} créé avec succès !", "success")
         return redirect(url_for("tickets.list_tickets"))
 
     return render_template("ticket_form.html", mode="create", vals={}, canaux=canaux, now=datetime.now())
 
+def _apply_cloture(updated, cloture_action=False):
+    """date_cloture / cloture_by following the new statut (closing, reopening)."""
+    if updated["statut"] == "Clôturé":
+        if not str(updated.get("date_cloture", "")).strip():
+            updated["date_cloture"] = _now_iso()
+        updated["cloture_by"] = g.user.get("username")
+        updated.pop("heure_cloture", None)
+    if cloture_action:
+        updated["date_cloture"] = _now_iso()
+        updated["cloture_by"] = g.user.get("username")
+    elif updated["statut"] == "Ouvert":
+        updated["date_cloture"] = ""
+        updated["cloture_by"] = ""
+
+def _save_edit(doc, updated, version, archived=False):
+    """
+    $set only what changed, guarded by the version the client loaded, then the
+    write side effects. Returns the changes ([]: nothing to do), None on conflict.
+    An archived ticket is moved back only once the edit is known to apply.
+    """
+    changes = field_changes(doc, updated)
+    if not changes:
+        return []
+    vf = _version_filter(version)
+    if vf is None:
+        return None
+    if archived:
+        if vf != _version_filter(doc.get("version")):
+            return None
+        restore_ticket(_db(), doc["id"])
+    update = {"$set": {c["field"]: c["new"] for c in changes}, "$inc": {"version": 1}}
+    if "heure_cloture" in doc and "heure_cloture" not in updated:
+        update["$unset"] = {"heure_cloture": ""}
+    res = coll("tickets").update_one({"id": doc["id"], **vf}, update, upsert=False)
+    if res.matched_count == 0:
+        return None
+    bump_data_version(_db())
+    audit.record(doc["id"], g.user.get("username"), "edit", changes)
+    statut_moved(_db(), doc.get("statut"), updated["statut"])
+    publish_ticket_change(_db(), doc, updated)
+    catalog_add(_db(), {c["field"]: c["new"] for c in changes})
+    return changes
+
 @tickets_bp.route("/edit/<id>", methods=["GET","POST"])
 def edit_ticket(id):
     ru = require_user()
@@ -430,6 +439,7 @@ def edit_ticket(id):
     if not doc:
         flash("Ticket introuvable.", "warning")
         return redirect(url_for("tickets.list_tickets"))
+    archived = doc.pop("_archived", False)
 
     canaux_rows = list(coll("canaux").find({}, {"_id":0,"canal":1}))
     canaux = sorted({(r.get("canal") or "").strip() for r in canaux_rows if (r.get("canal") or "").strip()})
@@ -440,123 +450,295 @@ def edit_ticket(id):
         f = request.form
         cloture_action = "cloturer" in f
 
-        missing = []
-        if not f.get("nom_prenom","").strip(): missing.append("Nom et Prénom client")
-        if not f.get("canal",""): missing.append("Canal")
-        if not f.get("statut",""): missing.append("statut")
-        if f.get("traitement") == "Exceptionnel" and not f.get("si_exceptionnel","").strip():
-            missing.append("Motif pour traitement exceptionnel")
-        for k in ["thematique","famille","sous_famille","categorie","sous_categorie","action"]:
-            if not f.get(k,"").strip(): missing.append(k.replace("_"," ").title())
+        missing = TicketRecord.missing_fields(f)
         if missing:
             flash("⚠️ Champs obligatoires manquants : " + ", ".join(missing), "danger")
             return render_template("ticket_form.html", mode="edit", vals=f, ticket_id=id, canaux=canaux, now=datetime.now())
 
-        def ffloat(x):
-            try: return float(x or 0)
-            except: return 0.0
-
-        updated = {**doc}
-        updated.update({
-            'nom_prenom': f.get("nom_prenom","").strip(),
-            'id_client': f.get("id_client","").strip(),
-            'num_cmd': f.get("num_cmd","").strip(),
-            'canal': f.get("canal",""),
-            'thematique': f.get("thematique",""),
-            'famille': f.get("famille",""),
-            'sous_famille': f.get("sous_famille",""),
-            'categorie': f.get("categorie",""),
-            'sous_categorie': f.get("sous_categorie",""),
-            'action': f.get("action",""),
-            'traitement': f.get("traitement","Normal"),
-            'si_exceptionnel': f.get("si_exceptionnel","").strip(),
-            'code_promo': f.get("code_promo","").strip(),
-            'prix_pdts': ffloat(f.get("prix_pdts")),
-            'mnt_commande': ffloat(f.get("mnt_commande")),
-            'mnt_rembour': ffloat(f.get("mnt_rembour")),
-            'mnt_gestco': ffloat(f.get("mnt_gestco")),
-            'total_code_promo': ffloat(f.get("mnt_rembour")) + ffloat(f.get("mnt_gestco")),
-            'retour_magasin': f.get("retour_magasin","").strip(),
-            'commentaires': f.get("commentaires","").strip(),
-            "statut": "Clôturé" if cloture_action else f.get("statut", "Ouvert"),
-            'magasin': f.get("magasin","").strip(),
-            'num_magasin': f.get("num_magasin","").strip(),
-            'ville': f.get("ville","").strip(),
-            'bu': f.get("bu","").strip(),
-            'region': f.get("region","").strip(),
-            'dr': f.get("dr","").strip(),
-            'dm': f.get("dm","").strip(),
-        })
-
-        # cloture
-        if updated["statut"] == "Clôturé":
-            if not str(updated.get("date_cloture", "")).strip():
-                updated["date_cloture"] = _now_iso()
-            updated["cloture_by"] = g.user.get("username")
-            updated.pop("heure_cloture", None)
+        updated = {**doc, **TicketRecord.form_values(f)}
         if cloture_action:
-            updated["date_cloture"] = _now_iso()
-            updated["cloture_by"] = g.user.get("username")
-        elif str(updated.get("statut","")).lower() == "ouvert":
-            updated["date_cloture"] = ""
-            updated["cloture_by"] = ""
-
-        # update by id regardless of stored type
-        coll("tickets").update_one(
-            {"$or": [{"id": str(id)}, {"id": _numeric_id(id)}]},
-            {"$set": updated},
-            upsert=False
-        )
+            updated["statut"] = "Clôturé"
+        _apply_cloture(updated, cloture_action)
+
+        changes = _save_edit(doc, updated, f.get("version"), archived)
+        if changes is None:
+            flash("⚠️ Ce ticket a été modifié par quelqu'un d'autre entre-temps. Vérifiez la version actuelle avant d'enregistrer.", "danger")
+            return redirect(url_for("tickets.edit_ticket", id=id))
+        if not changes:
+            flash("Aucune modification.", "info")
+            return redirect(url_for("tickets.list_tickets"))
         flash(f"✅ Ticket {id} mis à jour avec succès.", "success")
         return redirect(url_for("tickets.list_tickets"))
 
+    if archived:
+        flash("Ce ticket est archivé : il sera remis dans les tickets actifs à l'enregistrement.", "info")
     return render_template("ticket_form.html", mode="edit", vals=doc, now=datetime.now(), ticket_id=id, canaux=canaux)
 
+def _close(id):
+    """Close one open ticket; (before, sets) or None when already closed / not found."""
+    sets = {
+        "statut": "Clôturé",
+        "date_cloture": _now_iso(),
+        "cloture_by": g.user.get("username")
+    }
+    # BEFORE image -> history without an extra read (and the list row for the API)
+    before = coll("tickets").find_one_and_update(
+        {"id": _id_match(id), "statut": {"$not": statut_match(_db(), [CLOSED])}},
+        {"$set": sets,
+         "$unset": { "heure_cloture": "" },
+         "$inc": {"version": 1}},
+        projection={**LIST_PROJECTION, **{k: 1 for k in list(sets) + DIM_FIELDS}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None
+    bump_data_version(_db())
+    audit.record(before["id"], g.user.get("username"), "close", field_changes(before, sets))
+    statut_moved(_db(), before.get("statut"), CLOSED)
+    publish_ticket_change(_db(), before, {**before, **sets})
+    return before, sets
+
 @tickets_bp.route("/close/<id>", methods=["POST"])
 def close_ticket(id):
     ru = require_user()
     if ru: return ru
-    res = coll("tickets").update_one(
-        {"$and": [
-            {"$or": [{"id": str(id)}, {"id": _numeric_id(id)}]},
-            {"statut": {"$ne": "Clôturé"}}
-        ]},
-        {"$set": {
-            "statut": "Clôturé",
-            "date_cloture": _now_iso(),
-            "cloture_by": g.user.get("username")
-        },
-         "$unset": { "heure_cloture": "" }}
-    )
-    if res.matched_count == 0:
+    if _close(id) is None:
         flash("Déjà clôturé ou introuvable.", "warning")
     else:
         flash(f"Ticket {id} clôturé.", "success")
     return redirect(url_for("tickets.list_tickets"))
 
+# ---------- In-place updates (list rows patched without a reload) ----------
+
+QUICK_EDIT_FIELDS = ("statut", "commentaires", "retour_magasin", "traitement", "si_exceptionnel")
+
+@tickets_bp.post("/api/close/<id>")
+def api_close(id):
+    """Close one ticket; returns its list row."""
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    closed = _close(id)
+    if closed is None:
+        return jsonify({"error": "déjà clôturé ou introuvable"}), 409
+    before, sets = closed
+    return jsonify({"row": format_list_row({**before, **sets, "version": (before.get("version") or 0) + 1})})
+
+@tickets_bp.post("/api/edit/<id>")
+def api_quick_edit(id):
+    """
+    Quick edit of a few fields. Body: {"version": n, "fields": {statut, commentaires, ...}}.
+    Returns the updated list row; 409 when the ticket changed since version.
+    """
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    data = request.get_json(silent=True) or {}
+    fields = data.get("fields") or {}
+    unknown = sorted(set(fields) - set(QUICK_EDIT_FIELDS))
+    if unknown:
+        return jsonify({"error": "champs non modifiables: " + ", ".join(unknown)}), 400
+    parsed = TicketRecord.parse_fields(fields, QUICK_EDIT_FIELDS)
+    if not parsed:
+        return jsonify({"error": "aucun champ"}), 400
+    if "statut" in parsed and not parsed["statut"]:
+        return jsonify({"error": "statut requis"}), 400
+
+    doc = _find_ticket_by_id(id)
+    if not doc:
+        return jsonify({"error": "ticket introuvable"}), 404
+    archived = doc.pop("_archived", False)
+    updated = {**doc, **parsed}
+    if updated.get("traitement") == "Exceptionnel" and not str(updated.get("si_exceptionnel") or "").strip():
+        return jsonify({"error": "Motif pour traitement exceptionnel requis"}), 400
+    _apply_cloture(updated)
+
+    changes = _save_edit(doc, updated, data.get("version"), archived)
+    if changes is None:
+        return jsonify({"error": "Ce ticket a été modifié par quelqu'un d'autre entre-temps."}), 409
+    version = (doc.get("version") or 0) + (1 if changes else 0)
+    return jsonify({"row": format_list_row({**updated, "version": version}),
+                    "changed": [c["field"] for c in changes]})
+
+# ---------- Bulk operations ----------
+
+BULK_BATCH_SIZE = 500
+BULK_MAX_TICKETS = 5000
+BULK_FILTER_KEYS = ["agent", "statut", "thematique", "magasin"]
+THEMATIQUE_KEYS = ["thematique", "famille", "sous_famille", "categorie", "sous_categorie", "action"]
+
+def _bulk_update_for(op, data):
+    """
+    Build (extra_filter, update) for a bulk op, mirroring close_ticket / edit_ticket.
+    Returns (None, error_message) when the payload is invalid.
+    """
+    user = g.user.get("username")
+    if op == "close" or (op == "statut" and canon_statut(data.get("value")) == CLOSED):
+        return {"statut": {"$not": statut_match(_db(), [CLOSED])}}, {
+            "$set": {"statut": "Clôturé", "date_cloture": _now_iso(), "cloture_by": user},
+            "$unset": {"heure_cloture": ""},
+            "$inc": {"version": 1},
+        }
+    if op == "statut":
+        statut = canon_statut(data.get("value"))
+        if not statut:
+            return None, "statut requis"
+        sets = {"statut": statut}
+        if statut == "Ouvert":
+            sets.update({"date_cloture": "", "cloture_by": ""})
+        return {}, {"$set": sets, "$inc": {"version": 1}}
+    if op == "reassign":
+        agent = str(data.get("value") or "").strip()
+        if not agent:
+            return None, "agent requis"
+        return {}, {"$set": {"agent": agent}, "$inc": {"version": 1}}
+    if op == "thematique":
+        fields = data.get("fields") if isinstance(data.get("fields"), dict) else {}
+        sets = {k: str(fields[k] if fields[k] is not None else "").strip() for k in THEMATIQUE_KEYS if k in fields}
+        if not sets:
+            return None, "aucun champ thématique"
+        empty = [k for k, v in sets.items() if not v]
+        if empty:
+            return None, "valeur requise: " + ", ".join(empty)
+        return {}, {"$set": sets, "$inc": {"version": 1}}
+    return None, "opération inconnue"
+
+@tickets_bp.post("/api/bulk")
+def bulk_tickets():
+    """
+    Apply one operation to many tickets.
+    Body: {"op": "close"|"statut"|"reassign"|"thematique",
+           "ids": [...] or "filter": {agent, statut, thematique, magasin},
+           "value": "...", "fields": {...}}
+    """
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+
+    data = request.get_json(silent=True) or {}
+    op = data.get("op")
+    extra, update = _bulk_update_for(op, data)
+    if extra is None:
+        return jsonify({"error": update}), 400
+
+    # resolve target ids (explicit list or filter)
+    if data.get("ids"):
+        ids = [canon_ticket_id(x) for x in data["ids"] if str(x).strip()]
+    elif data.get("filter"):
+        flt = {k: v for k, v in (data["filter"] or {}).items() if k in BULK_FILTER_KEYS and v}
+        if not flt:
+            return jsonify({"error": "filtre vide"}), 400
+        ids = [canon_ticket_id(r.get("id")) for r in coll("tickets").find(flt, {"_id": 0, "id": 1}).limit(BULK_MAX_TICKETS + 1)]
+    else:
+        return jsonify({"error": "ids ou filter requis"}), 400
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BULK_MAX_TICKETS:
+        return jsonify({"error": f"maximum {BULK_MAX_TICKETS} tickets par opération"}), 400
+
+    # one read to know which ids exist (and which are already closed); legacy int ids included
+    found = {}
+    proj = {"_id": 0, "id": 1, "statut": 1, **{k: 1 for k in update["$set"]}}
+    legacy = [n for n in map(_numeric_id, ids) if n is not None]
+    for r in coll("tickets").find({"id": {"$in": ids + legacy}}, proj):
+        found.setdefault(canon_ticket_id(r["id"]), r)
+
+    # statut ops are guarded by the statut read above and grouped by it, so each
+    # group's modified_count is exactly its number of (before -> new) transitions
+    moves_statut = "statut" in update["$set"]
+    results, groups = [], {}
+    for i in ids:
+        r = found.get(i)
+        if r is None:
+            results.append({"id": i, "status": "not_found"})
+        elif extra.get("statut") and canon_statut(r.get("statut")) == CLOSED:
+            results.append({"id": i, "status": "already_closed"})
+        else:
+            results.append({"id": i, "status": "ok"})
+            flt = {"id": r.get("id"), "statut": r.get("statut")} if moves_statut else {"id": r.get("id"), **extra}
+            groups.setdefault(r.get("statut") if moves_statut else None, []).append(UpdateOne(flt, update))
+    ops = [op for group in groups.values() for op in group]
+
+    modified, transitions = 0, []
+    for before, group in groups.items():
+        for start in range(0, len(group), BULK_BATCH_SIZE):
+            res = coll("tickets").bulk_write(group[start:start + BULK_BATCH_SIZE], ordered=False)
+            modified += res.modified_count
+            if moves_statut:
+                transitions += [(before, update["$set"]["statut"])] * res.modified_count
+    if modified:
+        bump_data_version(_db())
+        publish_resync()  # too many tickets for per-ticket deltas
+        if transitions:
+            statut_moved_many(_db(), transitions)
+        catalog_add(_db(), update["$set"])
+
+    user = g.user.get("username")
+    for r in results:
+        if r["status"] == "ok":
+            audit.record(r["id"], user, f"bulk:{op}", field_changes(found[r["id"]], update["$set"]))
+
+    return jsonify({"op": op, "requested": len(ids), "matched": len(ops), "modified": modified, "results": results})
+
+@tickets_bp.get("/api/history/<id>")
+def api_history(id):
+    if not g.get("user"):
+        return jsonify({"error": "non authentifié"}), 401
+    try:
+        limit = max(1, min(int(request.args.get("limit", 100)), 500))
+    except ValueError:
+        limit = 100
+    rows = audit.history(id, limit=limit)
+    for r in rows:
+        r["ts"] = r["ts"].strftime("%d/%m/%Y %H:%M:%S")
+    return jsonify({"id": id, "rows": rows})
+
+CSV_CHUNK = 500
+CSV_SKIP = {"_id", "archive_month", "archived_at"}
+
+def _stored_keys(src):
+    # top-level keys present in the collection, read server side
+    return (r["_id"] for r in src.aggregate([
+        {"$project": {"kv": {"$objectToArray": "$$ROOT"}}},
+        {"$unwind": "$kv"},
+        {"$group": {"_id": "$kv.k"}},
+    ], allowDiskUse=True))
+
+def _csv_cell(v):
+    return "" if v is None else v
+
 @tickets_bp.route("/export.csv")
 def export_csv():
     ru = require_user()
     if ru: return ru
-    rows = list(coll("tickets").find({}, {"_id":0}))
-    df = pd.DataFrame(rows)
-    csv = df.to_csv(index=False).encode("utf-8")
-    return send_file(io.BytesIO(csv), mimetype="text/csv",
-                     as_attachment=True, download_name="tickets.csv")
+    sources = [coll("tickets")] + ([coll(ARCHIVE)] if needs_cold(_db()) else [])
+    # the ticket fields first, then every other stored key (as the old export did)
+    extra = sorted({k for src in sources for k in _stored_keys(src)} - set(EXPECTED_HEADERS) - CSV_SKIP, key=str)
+
+    def rows():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(list(EXPECTED_HEADERS) + extra)
+        for src in sources:
+            for n, doc in enumerate(src.find({}, {"_id": 0}), 1):
+                writer.writerow(TicketRecord.from_mongo(doc).to_row() + [_csv_cell(doc.get(k)) for k in extra])
+                if n % CSV_CHUNK == 0:
+                    yield out.getvalue()
+                    out.seek(0)
+                    out.truncate()
+        yield out.getvalue()
+
+    return Response(rows(), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=tickets.csv"})
 
 @tickets_bp.route("/analytics")
 def analytics():
     ru = require_user()
     if ru: return ru
-    rows = list(coll("tickets").find({}, {"_id":0}))
-    df = pd.DataFrame(rows)
-    if df.empty:
-        stats = {"total": 0, "ouverts": 0, "by_statut": {}, "top_them": []}
-    else:
-        df["date_creation"] = pd.to_datetime(df["date_creation"], errors="coerce", dayfirst=True)
-        total = len(df)
-        ouverts = int((df["statut"]=="Ouvert").sum())
-        by_statut = df["statut"].value_counts().to_dict()
-        top_them = df["thematique"].value_counts().head(10).reset_index().values.tolist()
-        stats = {"total": total, "ouverts": ouverts, "by_statut": by_statut, "top_them": top_them}
+    by_statut = statut_counts(_db())  # O(1): maintained counters
+    thems = coll("tickets").aggregate([
+        {"$match": {"thematique": {"$ne": None}}},
+        {"$group": {"_id": "$thematique", "n": {"$sum": 1}}},
+        {"$sort": {"n": -1}},
+        {"$limit": 10},
+    ])
+    stats = {"total": sum(by_statut.values()), "ouverts": by_statut.get("Ouvert", 0),
+             "by_statut": dict(sorted(by_statut.items(), key=lambda kv: -kv[1])),
+             "top_them": [[r["_id"], r["n"]] for r in thems]}
     return render_template("analytics.html", stats=stats)
@@ -0,0 +1,201 @@
+# app/tickets/rows.py
+"""
+Plain-dict row processing for the request paths (list, taxonomy helpers).
+Whole-ticket parsing and serialization live in record.py (TicketRecord).
+"""
+import math
+import re
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
+
+NULLY = {"", "None", "none", "nan", "NaN", "NaT", "_", "-"}
+
+def _strip_accents(s: str) -> str:
+    return ''.join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+# ---------- statut ----------
+
+STATUT_MAP = {
+    "ouvert": "Ouvert",
+    "open": "Ouvert",
+    "en cours": "En cours",
+    "en traitement": "En cours",
+    "cloture": "Clôturé",
+    "cloture ": "Clôturé",
+    "cloturee": "Clôturé",
+    "cloturé": "Clôturé",  # handles weird unicode
+    "cloturé": "Clôturé",
+    "cloturee ": "Clôturé",
+    "resolu": "Résolu",
+    "resolve": "Résolu",
+    "resolue": "Résolu",
+    "resolue ": "Résolu",
+}
+
+@lru_cache(maxsize=256)
+def _canon_statut_str(s: str) -> str:
+    s = s.strip()
+    return STATUT_MAP.get(_strip_accents(s).lower(), s)  # default to original if unknown
+
+def canon_statut(x):
+    return _canon_statut_str(str(x or ""))
+
+# ---------- dates ----------
+
+_FR_DATE = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?$")
+_FALLBACK_FORMATS = ("%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%d-%m-%Y", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d")
+
+def parse_date(v):
+    """
+    datetime or None. Same order as before: the app's ISO strings first,
+    then French 'dd/mm/YYYY HH:MM', then a few day-first leftovers.
+    """
+    if isinstance(v, datetime):
+        return v
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return None
+    s = str(v).strip()
+    if s in NULLY:
+        return None
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        pass
+    m = _FR_DATE.match(s)
+    if m:
+        d, mo, y, h, mi, sec = m.groups()
+        try:
+            return datetime(int(y), int(mo), int(d), int(h or 0), int(mi or 0), int(sec or 0))
+        except ValueError:
+            return None
+    for fmt in _FALLBACK_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    return None
+
+def format_date(dt) -> str:
+    return dt.strftime("%d/%m/%Y %H:%M") if dt else ""
+
+# ---------- money ----------
+
+def parse_money(v) -> float:
+    """12 / '12,5' / '_' / None -> float (0.0 when not a number)."""
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return 0.0 if isinstance(v, float) and math.isnan(v) else float(v)
+    s = str(v if v is not None else "").strip()
+    if s in NULLY:
+        return 0.0
+    try:
+        return float(s.replace(",", "."))
+    except ValueError:
+        return 0.0
+
+def format_money(v) -> str:
+    return f"{parse_money(v):.2f} MAD"
+
+# ---------- list_tickets ----------
+
+DISPLAY_COLS = ["id", "date_creation", "agent", "nom_prenom", "magasin", "thematique", "statut", "num_cmd", "id_client"]
+SEARCH_COLS = ["nom_prenom", "num_cmd", "id_client", "magasin", "commentaires", "id"]
+LIST_PROJECTION = {"_id": 0, "version": 1, **{c: 1 for c in DISPLAY_COLS + SEARCH_COLS}}
+
+def _text(v) -> str:
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return ""
+    return str(v)
+
+def _distinct(rows, col):
+    return sorted({r.get(col) for r in rows if r.get(col) is not None and str(r.get(col)).strip()}, key=str)
+
+def prepare_list_rows(rows, dmin=None, dmax=None, search=""):
+    """
+    Filter (date range, free-text search), sort (newest first) and format the
+    rows of list_tickets. Returns (rows, agents, statuts, thems, magasins).
+    """
+    for r in rows:
+        r["__dc"] = parse_date(r.get("date_creation"))
+
+    if dmin or dmax:
+        lo = datetime.fromisoformat(dmin).date() if dmin else None
+        hi = datetime.fromisoformat(dmax).date() if dmax else None
+        rows = [r for r in rows if r["__dc"] is not None
+                and (lo is None or r["__dc"].date() >= lo)
+                and (hi is None or r["__dc"].date() <= hi)]
+
+    if search:
+        rows = [r for r in rows if any(search in _text(r.get(c)).lower() for c in SEARCH_COLS)]
+
+    agents, statuts = _distinct(rows, "agent"), _distinct(rows, "statut")
+    thems, magasins = _distinct(rows, "thematique"), _distinct(rows, "magasin")
+
+    rows.sort(key=lambda r: (r["__dc"] is not None, r["__dc"] or datetime.min), reverse=True)
+
+    return [format_list_row(r, r["__dc"]) for r in rows], agents, statuts, thems, magasins
+
+def format_list_row(r, dc=None):
+    """One ticket as list_tickets shows it (also returned by the in-place close/quick-edit APIs)."""
+    dc = dc or parse_date(r.get("date_creation"))
+    return {
+        "id": _text(r.get("id")),
+        "date_creation": format_date(dc),
+        "date_iso": dc.strftime("%Y-%m-%dT%H:%M:%S") if dc else "",
+        "agent": _text(r.get("agent")).strip(),
+        "nom_prenom": _text(r.get("nom_prenom")),
+        "magasin": _text(r.get("magasin")).strip(),
+        "thematique": _text(r.get("thematique")).strip(),
+        "statut": canon_statut(r.get("statut")),
+        "num_cmd": _text(r.get("num_cmd")),
+        "id_client": _text(r.get("id_client")),
+        "commentaires": _text(r.get("commentaires")),
+        "version": r.get("version", 0),
+    }
+
+# ---------- thematiques ----------
+
+THEM_COLS = ["Thematique", "Famille", "Sous Famille", "Categorie", "Sous Categorie", "Action"]
+
+CANON_MAP = {
+    "thematique": "Thematique",
+    "famille": "Famille",
+    "sous famille": "Sous Famille",
+    "sous_famille": "Sous Famille",
+    "categorie": "Categorie",
+    "catégorie": "Categorie",
+    "sous categorie": "Sous Categorie",
+    "sous catégorie": "Sous Categorie",
+    "actions": "Action",
+    "action": "Action",
+}
+
+_SPACES = re.compile(r"\s+")
+
+@lru_cache(maxsize=128)
+def _slug_col(name: str) -> str:
+    s = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return _SPACES.sub(" ", s.strip()).lower()
+
+@lru_cache(maxsize=128)
+def _canon_col(name: str) -> str:
+    return CANON_MAP.get(_slug_col(name), name)
+
+@lru_cache(maxsize=4096)
+def _canon_val(s: str) -> str:
+    return unicodedata.normalize("NFKC", s).strip()
+
+def normalize_thematiques_rows(rows):
+    """Rename taxonomy headers to THEM_COLS and NFKC/strip every value (all values as str)."""
+    out = []
+    for r in rows:
+        d = {}
+        for k, v in r.items():
+            col = _canon_col(k)
+            val = _canon_val(_text(v))
+            if col not in d or (not d[col] and val):
+                d[col] = val
+        for col in THEM_COLS:
+            d.setdefault(col, "")
+        out.append(d)
+    return out
@@ -0,0 +1,127 @@
+# app/tickets/statut.py
+"""
+Canonical statut storage and per-statut counters.
+Every write stores canon_statut(...); once `flask tickets canon-statut` has
+set counters.statut.canonical, filters are exact (indexed) matches, before
+that they list every legacy spelling. counters.statut holds the number of
+tickets per statut (hot + archive, since archiving only moves closed tickets),
+moved with $inc on each transition. Its counts are only trusted once a full
+recount ('flask tickets recount-statut' or 'canon-statut') has set 'counted';
+until then statut_counts reads the statut index instead.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .archive import ARCHIVE
+from .rows import STATUT_MAP, canon_statut
+
+COUNTERS_ID = "statut"
+CLOSED = "Clôturé"
+SOURCES = ("tickets", ARCHIVE)
+CANONICAL_TTL = 60  # s, per-process cache of a missing 'canonical' flag
+
+_counted = set()                # db names whose counters are trusted (per process)
+_canonical = {}                 # db name -> (checked_at, flag)
+
+def _key(statut):
+    # counters are sub-fields: no '.' or leading '$' in the key
+    return "counts." + (statut or "(vide)").replace(".", "_").lstrip("$")
+
+def statuts_canonical(db):
+    """True once every stored statut has been canonicalised (flask tickets canon-statut)."""
+    at, flag = _canonical.get(db.name, (0.0, False))
+    if not flag and time.monotonic() - at > CANONICAL_TTL:
+        doc = db["counters"].find_one({"_id": COUNTERS_ID}, {"canonical": 1}) or {}
+        flag = bool(doc.get("canonical"))
+        _canonical[db.name] = (time.monotonic(), flag)
+    return flag
+
+def statut_spellings(statuts):
+    """Every stored spelling that canonicalises into one of `statuts`."""
+    vals = set(statuts)
+    for key, canon in STATUT_MAP.items():
+        if canon in statuts:
+            key = key.strip()
+            vals.update({key, key.capitalize(), key.title(), key.upper()})
+    return sorted(vals)
+
+def statut_match(db, statuts):
+    """Condition on 'statut': exact once backfilled, legacy spellings included before."""
+    statuts = [canon_statut(s) for s in statuts]
+    return {"$in": statuts if statuts_canonical(db) else statut_spellings(statuts)}
+
+def statut_moved(db, before, after):
+    """Record one transition (before None: creation). Values are canonicalised here."""
+    before = canon_statut(before) if before is not None else None
+    after = canon_statut(after)
+    if before == after:
+        return
+    inc = {_key(after): 1}
+    if before is not None:
+        inc[_key(before)] = -1
+    db["counters"].update_one({"_id": COUNTERS_ID}, {"$inc": inc}, upsert=True)
+
+def statut_moved_many(db, transitions):
+    """Several (before, after) transitions in one counter update."""
+    inc = {}
+    for before, after in transitions:
+        before, after = canon_statut(before), canon_statut(after)
+        if before != after:
+            inc[_key(after)] = inc.get(_key(after), 0) + 1
+            inc[_key(before)] = inc.get(_key(before), 0) - 1
+    inc = {k: v for k, v in inc.items() if v}
+    if inc:
+        db["counters"].update_one({"_id": COUNTERS_ID}, {"$inc": inc}, upsert=True)
+
+def _scan_counts(db):
+    # {counter key: n} from the statut index, hot + archive
+    counts = {}
+    for src in SOURCES:
+        for r in db[src].aggregate([{"$group": {"_id": "$statut", "n": {"$sum": 1}}}]):
+            k = _key(canon_statut(r["_id"]))[len("counts."):]
+            counts[k] = counts.get(k, 0) + r["n"]
+    return counts
+
+def statut_counts(db):
+    """{statut: n} from the counters once recounted, from the statut index before (zeros dropped)."""
+    doc = db["counters"].find_one({"_id": COUNTERS_ID}, {"counts": 1, "counted": 1}) or {}
+    if doc.get("counted"):
+        _counted.add(db.name)
+        counts = doc.get("counts") or {}
+    else:
+        counts = _scan_counts(db)
+    return {k: n for k, n in counts.items() if n > 0}
+
+def rebuild_statut_counts(db):
+    """
+    Recount from the statut index and $set the counters (CLI only, never on a
+    request path). A transition $inc-ed while the scan runs may be counted
+    once more or lost: run it when writes are quiet, or run it again.
+    """
+    counts = _scan_counts(db)
+    db["counters"].update_one({"_id": COUNTERS_ID},
+                              {"$set": {"counts": counts, "counted": True}}, upsert=True)
+    _counted.add(db.name)
+    return counts
+
+def canonicalize_statuts(db, workers=4, echo=print):
+    """
+    Backfill: one update_many per non-canonical spelling (found through the
+    statut index), run concurrently, then an exact recount. Returns modified count.
+    """
+    for src in SOURCES:
+        db[src].create_index("statut")
+    jobs = [(src, raw, canon_statut(raw)) for src in SOURCES
+            for raw in db[src].distinct("statut") if raw is not None and canon_statut(raw) != raw]
+
+    def fix(job):
+        src, raw, canon = job
+        n = db[src].update_many({"statut": raw}, {"$set": {"statut": canon}}).modified_count
+        echo(f"{src}: {raw!r} -> {canon!r} ({n})")
+        return n
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        modified = sum(pool.map(fix, jobs))
+    rebuild_statut_counts(db)
+    # from now on filters match the canonical values exactly
+    db["counters"].update_one({"_id": COUNTERS_ID}, {"$set": {"canonical": True}})
+    return modified
@@ -0,0 +1,97 @@
+# app/tickets/stores.py
+"""
+Store typeahead for the ticket form: an in-memory index of the magasins
+(sorted folded tokens for prefix lookups + folded haystacks for substrings),
+rebuilt per process every STORE_TTL seconds or after an admin change.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from .rows import _strip_accents
+
+STORE_TTL = 60  # s
+MAX_LIMIT = 50
+
+# champ du formulaire -> colonnes possibles dans magasins (CSV d'origine ou admin)
+FORM_FIELDS = {
+    "num_magasin": ["Code magasin", "code_magasin", "Num Magasin", "num_magasin"],
+    "ville": ["Ville", "ville"],
+    "bu": ["BU", "bu"],
+    "region": ["Region", "region"],
+    "dr": ["DR", "dr"],
+    "dm": ["DM", "dm"],
+}
+LABEL_FIELDS = ["Magasin", "magasin", "nom_magasin", "nom", "store_name"]
+PROJECTION = {"_id": 0, **{c: 1 for c in LABEL_FIELDS + sum(FORM_FIELDS.values(), [])}}
+
+_SPACES = re.compile(r"\s+")
+_TOKEN = re.compile(r"[^\W_]+")
+
+def fold(s) -> str:
+    """Accent/case-insensitive comparison form."""
+    return _SPACES.sub(" ", _strip_accents(str(s or "")).lower()).strip()
+
+def _first(row, cols):
+    for c in cols:
+        v = row.get(c)
+        if v not in (None, ""):
+            return str(v).strip()
+    return ""
+
+class StoreIndex:
+    def __init__(self, rows):
+        self.items = []      # {"label", num_magasin, ville, bu, region, dr, dm}
+        self.haystack = []   # folded "label code ville" per item
+        self.bu_by_name = {} # lower(label) -> BU, as the analytics $lookup matches it
+        self.by_name = {}    # lower(label) -> item (region/dr/dm of the analytics drill-down)
+        keys = []            # (folded token, item index)
+        seen = set()
+        for r in rows:
+            label = _first(r, LABEL_FIELDS)
+            if not label or label in seen:
+                continue
+            seen.add(label)
+            item = {"label": label, **{f: _first(r, cols) for f, cols in FORM_FIELDS.items()}}
+            i = len(self.items)
+            self.items.append(item)
+            self.bu_by_name.setdefault(label.lower(), item["bu"])
+            self.by_name.setdefault(label.lower(), item)
+            text = fold(f"{label} {item['num_magasin']} {item['ville']}")
+            self.haystack.append(text)
+            keys.append((fold(label), i))  # whole name, so "marjane ha" matches as a prefix
+            keys.extend((t, i) for t in set(_TOKEN.findall(text)))
+        keys.sort()
+        self.keys = keys
+        self.tokens = [k for k, _ in keys]
+
+    def search(self, q, limit=20):
+        """Name prefix first, then any word prefix (name/code/ville), then substrings."""
+        q = fold(q)
+        if not q:
+            return []
+        hits = set()
+        pos = bisect_left(self.tokens, q)
+        while pos < len(self.tokens) and self.tokens[pos].startswith(q):
+            hits.add(self.keys[pos][1])
+            pos += 1
+        ranked = sorted(hits, key=lambda i: (not self.haystack[i].startswith(q), self.items[i]["label"]))
+        if len(ranked) < limit:
+            ranked += sorted((i for i, h in enumerate(self.haystack) if i not in hits and q in h),
+                             key=lambda i: self.items[i]["label"])
+        return [self.items[i] for i in ranked[:limit]]
+
+_state = {"at": 0.0, "index": None}
+_lock = threading.Lock()
+
+def store_index(db):
+    with _lock:
+        now = time.monotonic()
+        if _state["index"] is None or now - _state["at"] > STORE_TTL:
+            _state["index"] = StoreIndex(db["magasins"].find({}, PROJECTION))
+            _state["at"] = now
+        return _state["index"]
+
+def invalidate():
+    """Called after admin writes so this process rebuilds on the next lookup."""
+    _state["at"] = 0.0
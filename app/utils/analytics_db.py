@@ -0,0 +1,122 @@
+import asyncio, logging, os, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.errors import ExecutionTimeout
+
+log = logging.getLogger(__name__)
+
+class AnalyticsClient:
+    """
+    Separate MongoClient for the analytics blueprint: its own connection pool
+    and read preference, so heavy aggregations never wait on (or starve) the
+    pool used by ticket writes. Aggregations run under a maxTimeMS budget;
+    on timeout the last good result for the same key is returned as stale.
+
+    submit() runs an aggregation on a per-process event loop with an
+    AsyncMongoClient, so one request can have several in flight; at most
+    ANALYTICS_ASYNC_CONCURRENCY run at once per worker.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_pid = None
+
+    def init_app(self, app):
+        self.uri = uri = app.config.get("ANALYTICS_MONGO_URI") or app.config["MONGO_URI"]
+        self._dbname = app.config["MONGO_DBNAME"]
+        self.read_preference = app.config.get("ANALYTICS_READ_PREFERENCE", "primaryPreferred")
+        self.max_time_ms = int(app.config.get("ANALYTICS_MAX_TIME_MS", 5000))
+        self.allow_disk_use = bool(app.config.get("ANALYTICS_ALLOW_DISK_USE", True))
+        self.stale_max = int(app.config.get("ANALYTICS_STALE_MAX", 256))
+        self.pool_size = int(app.config.get("ANALYTICS_POOL_SIZE", 10))
+        self.async_enabled = bool(app.config.get("ANALYTICS_ASYNC", True))
+        self.concurrency = int(app.config.get("ANALYTICS_ASYNC_CONCURRENCY", 6))
+        # connect=False: sockets are opened lazily, after gunicorn's fork
+        self._client = MongoClient(
+            uri,
+            maxPoolSize=self.pool_size,
+            readPreference=self.read_preference,
+            appname="ticketing-analytics",
+            connect=False,
+        )
+
+    def db(self):
+        return self._client.get_database(self._dbname)
+
+    def aggregate(self, coll, pipeline, key=None):
+        """
+        (rows, stale). With a key, a successful result is kept (LRU) and
+        served back with stale=True when a later run exceeds the budget.
+        """
+        try:
+            rows = list(self.db()[coll].aggregate(
+                pipeline, maxTimeMS=self.max_time_ms, allowDiskUse=self.allow_disk_use))
+        except ExecutionTimeout as e:
+            return self._stale(key, e)
+        self._remember(key, rows)
+        return rows, False
+
+    def _stale(self, key, timeout):
+        with self._lock:
+            last = self._last.get(key) if key is not None else None
+        if last is None:
+            raise timeout
+        log.warning("analytics timeout (%sms), serving stale result for %r", self.max_time_ms, key)
+        return last, True
+
+    def _remember(self, key, rows):
+        if key is None:
+            return
+        with self._lock:
+            self._last[key] = rows
+            self._last.move_to_end(key)
+            while len(self._last) > self.stale_max:
+                self._last.popitem(last=False)
+
+    def _ensure_loop(self):
+        # one event loop thread per process, started lazily after gunicorn's fork
+        if self._loop is not None and self._loop_pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="analytics-async", daemon=True).start()
+                self._aclient = asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._sem = asyncio.Semaphore(self.concurrency)
+                self._loop, self._loop_pid = loop, os.getpid()
+        return self._loop
+
+    async def _open(self):
+        # created on the loop it will be used from
+        return AsyncMongoClient(self.uri, maxPoolSize=self.pool_size, readPreference=self.read_preference,
+                                appname="ticketing-analytics-async")
+
+    async def _aggregate_async(self, coll, pipeline, key):
+        async with self._sem:
+            try:
+                cursor = await self._aclient.get_database(self._dbname)[coll].aggregate(
+                    pipeline, maxTimeMS=self.max_time_ms, allowDiskUse=self.allow_disk_use)
+                rows = await cursor.to_list(None)
+            except ExecutionTimeout as e:
+                return self._stale(key, e)
+        self._remember(key, rows)
+        return rows, False
+
+    def submit(self, coll, pipeline, key=None):
+        """
+        Future of aggregate(...)'s (rows, stale), scheduled on the event loop.
+        cancel() abandons the query: its connection is closed, which makes the
+        server interrupt it. With ANALYTICS_ASYNC off it runs here, synchronously.
+        """
+        if not self.async_enabled:
+            fut = Future()
+            try:
+                fut.set_result(self.aggregate(coll, pipeline, key))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+        return asyncio.run_coroutine_threadsafe(self._aggregate_async(coll, pipeline, key), self._ensure_loop())
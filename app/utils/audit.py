@@ -0,0 +1,131 @@
+import atexit, logging, os, queue, threading
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+HISTORY = "ticket_history"
+_STOP = object()
+
+def field_changes(before: dict, after: dict, fields=None):
+    """[{field, old, new}] for every key whose value differs between two ticket dicts."""
+    keys = fields or sorted(set(before) | set(after))
+    out = []
+    for k in keys:
+        if k == "_id" or k not in after:
+            continue
+        old, new = before.get(k), after.get(k)
+        if old != new and str(old if old is not None else "") != str(new if new is not None else ""):
+            out.append({"field": k, "old": old, "new": new})
+    return out
+
+class AuditWriter:
+    """
+    Buffers ticket history entries in memory and writes them from a background
+    thread with insert_many, so the request never waits on the history collection.
+    Queue is bounded: when full, entries are dropped (and counted) instead of blocking.
+    """
+
+    def __init__(self):
+        self._q = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def init_app(self, app, mongo):
+        self._mongo = mongo
+        self._dbname = app.config["MONGO_DBNAME"]
+        self.max_queue = int(app.config.get("AUDIT_QUEUE_MAX", 10000))
+        self.batch_size = int(app.config.get("AUDIT_BATCH_SIZE", 200))
+        self.interval = float(app.config.get("AUDIT_FLUSH_INTERVAL", 2.0))
+        self._q = queue.Queue(maxsize=self.max_queue)
+        atexit.register(self.stop)
+
+    def _coll(self):
+        return self._mongo.cx.get_database(self._dbname)[HISTORY]
+
+    def _ensure_thread(self):
+        # started lazily so each gunicorn worker (post-fork) gets its own writer
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._q = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def record(self, ticket_id, user, action, changes=None):
+        """Enqueue one history entry; never blocks the caller."""
+        if self._q is None or (action == "edit" and not changes):
+            return
+        self._ensure_thread()
+        entry = {
+            "ticket_id": str(ticket_id),
+            "ts": datetime.now(),
+            "user": user or "",
+            "action": action,
+            "changes": changes or [],
+        }
+        try:
+            self._q.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                log.warning("audit queue full, %d history entries dropped so far", self.dropped)
+
+    def _run(self):
+        try:
+            self._coll().create_index([("ticket_id", 1), ("ts", -1)])
+        except Exception:
+            log.exception("could not create ticket_history index")
+        stop = False
+        while not stop:
+            batch = []
+            try:
+                item = self._q.get(timeout=self.interval)
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+                while len(batch) < self.batch_size:
+                    item = self._q.get_nowait()
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if stop:
+                # drain whatever is left before exiting
+                while True:
+                    try:
+                        item = self._q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        for start in range(0, len(batch), self.batch_size):
+            try:
+                self._coll().insert_many(batch[start:start + self.batch_size], ordered=False)
+            except Exception:
+                log.exception("failed to write %d history entries", len(batch[start:start + self.batch_size]))
+
+    def stop(self, timeout=5.0):
+        """Flush pending entries and stop the writer (registered with atexit)."""
+        if not self._thread or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self._q.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def history(self, ticket_id, limit=100):
+        cur = self._coll().find({"ticket_id": str(ticket_id)}, {"_id": 0}).sort("ts", -1).limit(limit)
+        return list(cur)
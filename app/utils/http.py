@@ -0,0 +1,106 @@
+import gzip, hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+DATA_VERSION_ID = "data_version"
+
+# ---------- Compression ----------
+
+class Compress:
+    """after_request gzip/brotli for text responses above a size threshold."""
+
+    def init_app(self, app):
+        self.min_size = int(app.config.get("COMPRESS_MIN_SIZE", 500))
+        self.level = int(app.config.get("COMPRESS_LEVEL", 6))
+        self.br_quality = int(app.config.get("COMPRESS_BR_QUALITY", 4))
+        self.mimetypes = set(app.config.get("COMPRESS_MIMETYPES", [
+            "text/html", "text/css", "text/csv", "text/plain",
+            "application/json", "application/javascript",
+        ]))
+        app.after_request(self.after_request)
+
+    def _encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+    def after_request(self, resp):
+        if (resp.direct_passthrough or resp.is_streamed
+                or resp.status_code < 200 or resp.status_code >= 300
+                or "Content-Encoding" in resp.headers
+                or resp.mimetype not in self.mimetypes):
+            return resp
+        resp.vary.add("Accept-Encoding")
+        encoding = self._encoding()
+        data = resp.get_data()
+        if encoding is None or len(data) < self.min_size:
+            return resp
+        if encoding == "br":
+            data = brotli.compress(data, quality=self.br_quality)
+        else:
+            data = gzip.compress(data, compresslevel=self.level)
+        resp.set_data(data)
+        resp.headers["Content-Encoding"] = encoding
+        return resp
+
+# ---------- Data version / conditional GET ----------
+
+def bump_data_version(db):
+    """Call after any write that changes what list/analytics views show."""
+    db["counters"].update_one(
+        {"_id": DATA_VERSION_ID},
+        {"$inc": {"seq": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+def data_version(db):
+    """(seq, updated_at) of the last ticket/reference write."""
+    doc = db["counters"].find_one({"_id": DATA_VERSION_ID}) or {}
+    ts = doc.get("updated_at")
+    if ts is not None and ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return doc.get("seq", 0), ts
+
+def conditional_get(db_getter):
+    """
+    ETag from the data version, the full URL, the user and the session's
+    CSRF token (pages embed it), so an unchanged view answers 304 without
+    running the query or the template. No If-Modified-Since: a date alone
+    does not tell users, URLs or sessions apart.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # pending flash messages must be rendered, never served from cache
+            if request.method != "GET" or session.get("_flashes"):
+                return fn(*args, **kwargs)
+            seq, _ = data_version(db_getter())
+            user = (g.get("user") or {}).get("username", "")
+            if "csrf" in current_app.extensions:
+                generate_csrf()  # the token the page will embed exists before hashing it
+            csrf = session.get(current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"), "")
+            etag = hashlib.sha1(f"{seq}|{user}|{csrf}|{request.full_path}".encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                resp = make_response("", 304)
+                resp.set_etag(etag, weak=True)
+                return resp
+
+            resp = make_response(fn(*args, **kwargs))
+            # views opt out with Cache-Control: no-store (e.g. stale fallbacks)
+            if resp.status_code == 200 and "no-store" not in resp.headers.get("Cache-Control", ""):
+                resp.set_etag(etag, weak=True)
+                resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return deco
@@ -0,0 +1,135 @@
+import logging, os, tempfile, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+
+log = logging.getLogger(__name__)
+
+JOBS = "jobs"
+JOB_FILES = "job_files"
+
+class JobRunner:
+    """
+    In-process worker pool for long jobs (reports). Job state lives in the
+    'jobs' collection and the output file in GridFS ('job_files'), so any
+    worker on any host can answer status/download; JOBS_DIR only holds the
+    file while it is being written. A running job whose heartbeat is older
+    than JOBS_STALE_MINUTES (its process died) is marked as failed.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, mongo):
+        self._app = app
+        self._mongo = mongo
+        self._dbname = app.config["MONGO_DBNAME"]
+        self.workers = int(app.config.get("JOBS_WORKERS", 2))
+        self.ttl = timedelta(hours=float(app.config.get("JOBS_TTL_HOURS", 24)))
+        self.stale = timedelta(minutes=float(app.config.get("JOBS_STALE_MINUTES", 10)))
+        self.dir = app.config.get("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "ticketing-jobs")
+        os.makedirs(self.dir, exist_ok=True)
+
+    def task(self, kind):
+        """Register fn(params, progress, path) as the handler of a job kind."""
+        def deco(fn):
+            self._tasks[kind] = fn
+            return fn
+        return deco
+
+    def _coll(self):
+        return self._mongo.cx.get_database(self._dbname)[JOBS]
+
+    def _files(self):
+        return GridFSBucket(self._mongo.cx.get_database(self._dbname), bucket_name=JOB_FILES)
+
+    def _executor(self):
+        # one pool per process (pools do not survive gunicorn's fork)
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+                self._pid = os.getpid()
+            return self._pool
+
+    def submit(self, kind, params, user, filename):
+        if kind not in self._tasks:
+            raise KeyError(kind)
+        self.purge()
+        job_id = uuid.uuid4().hex
+        self._coll().insert_one({
+            "_id": job_id, "kind": kind, "params": params, "user": user,
+            "status": "queued", "progress": 0, "message": "",
+            "filename": filename, "path": os.path.join(self.dir, f"{job_id}-{filename}"),
+            "created_at": datetime.now(), "started_at": None, "finished_at": None, "error": None,
+            "heartbeat": None, "file_id": None,
+        })
+        self._executor().submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id):
+        coll = self._coll()
+        job = coll.find_one({"_id": job_id})
+        now = datetime.now()
+        coll.update_one({"_id": job_id}, {"$set": {"status": "running", "started_at": now, "heartbeat": now}})
+        last = [0.0]
+
+        def progress(pct, message=""):
+            # throttled: at most ~2 writes/s per job; each write is a heartbeat
+            now = time.monotonic()
+            if now - last[0] >= 0.5 or pct >= 100:
+                last[0] = now
+                coll.update_one({"_id": job_id}, {"$set": {
+                    "progress": int(pct), "message": message, "heartbeat": datetime.now()}})
+
+        try:
+            with self._app.app_context():
+                self._tasks[job["kind"]](job["params"], progress, job["path"])
+            with open(job["path"], "rb") as f:
+                file_id = self._files().upload_from_stream(job["filename"], f, metadata={"job_id": job_id})
+            coll.update_one({"_id": job_id}, {"$set": {
+                "status": "done", "progress": 100, "file_id": file_id, "finished_at": datetime.now()}})
+        except Exception as e:
+            log.exception("job %s failed", job_id)
+            coll.update_one({"_id": job_id}, {"$set": {
+                "status": "error", "error": str(e), "finished_at": datetime.now()}})
+        finally:
+            try:
+                os.remove(job["path"])
+            except OSError:
+                pass
+
+    def get(self, job_id):
+        self._expire(job_id)
+        return self._coll().find_one({"_id": job_id})
+
+    def open(self, job):
+        """Readable stream of a done job's file, or None when it is gone."""
+        try:
+            return self._files().open_download_stream(job["file_id"])
+        except (NoFile, KeyError):
+            return None
+
+    def _expire(self, job_id=None):
+        # the process running it died (restart, OOM, other host): no more heartbeats
+        q = {"status": "running", "heartbeat": {"$lt": datetime.now() - self.stale}}
+        if job_id is not None:
+            q["_id"] = job_id
+        self._coll().update_many(q, {"$set": {
+            "status": "error", "error": "tâche interrompue", "finished_at": datetime.now()}})
+
+    def purge(self):
+        """Mark stale jobs as failed; drop jobs (and their files) older than JOBS_TTL_HOURS."""
+        self._expire()
+        limit = datetime.now() - self.ttl
+        files = self._files()
+        for job in self._coll().find({"created_at": {"$lt": limit}}, {"file_id": 1}):
+            if job.get("file_id") is not None:
+                try:
+                    files.delete(job["file_id"])
+                except NoFile:
+                    pass
+        self._coll().delete_many({"created_at": {"$lt": limit}})
@@ -0,0 +1,150 @@
+import logging, os, queue, threading, time
+from datetime import datetime
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+log = logging.getLogger(__name__)
+
+LIVE = "live_events"
+
+class Subscriber:
+    """One SSE client: a bounded queue; 'lagged' once it falls behind (needs a resync)."""
+
+    def __init__(self, maxsize, user=None):
+        self.q = queue.Queue(maxsize=maxsize)
+        self.lagged = False
+        self.user = user
+
+    def get(self, timeout):
+        try:
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def reset(self):
+        """Drop whatever is queued (superseded by a resync)."""
+        while True:
+            try:
+                self.q.get_nowait()
+            except queue.Empty:
+                break
+        self.lagged = False
+
+class LiveHub:
+    """
+    Small pub/sub for live dashboards across gunicorn workers. Events are
+    inserted in a capped collection; one tailing thread per process fans
+    them out to the in-process subscribers (no per-client Mongo cursor).
+    """
+
+    def __init__(self):
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._capped = False
+
+    def init_app(self, app, mongo):
+        self._mongo = mongo
+        self._dbname = app.config["MONGO_DBNAME"]
+        self.size = int(app.config.get("LIVE_CAPPED_BYTES", 1 << 20))
+        self.queue_max = int(app.config.get("LIVE_QUEUE_MAX", 200))
+        # an SSE stream holds a gthread thread for up to LIVE_MAX_SECONDS: keep
+        # most of them for ticket writes, whatever LIVE_MAX_SUBSCRIBERS says
+        threads = int(app.config.get("WEB_THREADS", 8))
+        self.max_subscribers = max(1, min(int(app.config.get("LIVE_MAX_SUBSCRIBERS", threads // 4)), threads // 2))
+        # several tabs of one user must not take every stream slot
+        self.max_per_user = max(1, int(app.config.get("LIVE_MAX_PER_USER", 1)))
+
+    def _db(self):
+        return self._mongo.cx.get_database(self._dbname)
+
+    def _ensure_capped(self):
+        # must exist before the first insert, or Mongo creates a regular collection
+        if self._capped:
+            return
+        try:
+            self._db().create_collection(LIVE, capped=True, size=self.size)
+        except CollectionInvalid:
+            pass
+        self._capped = True
+
+    def publish(self, event):
+        """Insert one event; never raises into the caller (a live view is best effort)."""
+        try:
+            self._ensure_capped()
+            self._db()[LIVE].insert_one({**event, "ts": datetime.now()})
+        except Exception:
+            log.exception("live event not published")
+
+    def subscribe(self, user=None):
+        """Subscriber, or None when this process already serves max_subscribers (or max_per_user for user)."""
+        self._ensure_thread()
+        with self._lock:
+            if len(self._subs) >= self.max_subscribers:
+                return None
+            if user is not None and sum(s.user == user for s in self._subs) >= self.max_per_user:
+                return None
+            sub = Subscriber(self.queue_max, user)
+            self._subs.add(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def _ensure_thread(self):
+        # one tailer per process, started lazily (after gunicorn's fork)
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._subs = set()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._tail, name="live-tailer", daemon=True)
+            self._thread.start()
+
+    def _fan_out(self, event):
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            try:
+                sub.q.put_nowait(event)
+            except queue.Full:
+                sub.lagged = True
+
+    @staticmethod
+    def _newest(coll):
+        newest = list(coll.find({}, {"_id": 1}).sort("$natural", -1).limit(1))
+        return newest[0]["_id"] if newest else None
+
+    def _tail(self):
+        last, started = None, False
+        while True:
+            try:
+                self._ensure_capped()
+                coll = self._db()[LIVE]
+                if not started:
+                    # only events published from now on
+                    last, started = self._newest(coll), True
+                elif last is not None and coll.find_one({"_id": last}, {"_id": 1}) is None:
+                    # our position rolled out of the capped collection: events may be lost
+                    self._fan_out({"type": "resync"})
+                    last = self._newest(coll)
+                # resume in insertion (natural) order, skipping up to the last event seen:
+                # ObjectIds from several processes are not monotonic, so no _id > last
+                skipping = last is not None
+                cursor = coll.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    for doc in cursor:
+                        if skipping:
+                            skipping = doc["_id"] != last
+                            continue
+                        last = doc["_id"]
+                        doc["id"] = str(doc.pop("_id"))
+                        doc.pop("ts", None)
+                        self._fan_out(doc)
+                    time.sleep(0.2)
+            except Exception:
+                log.exception("live tailer error, retrying")
+            time.sleep(1.0)  # empty capped collection: the tailable cursor dies at once
@@ -0,0 +1,210 @@
+import atexit, hashlib, logging, os, threading
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+log = logging.getLogger(__name__)
+
+SKETCHES = "repeat_sketches"
+REPEAT_DIMS = ("id_client", "num_cmd")
+
+def repeat_key(value):
+    """Identifier as counted (trimmed, case-insensitive); '' when absent."""
+    return str(value or "").strip().upper()
+
+class CountMinSketch:
+    """depth x width counters; estimate = min over the rows (never under-counts)."""
+
+    def __init__(self, width, depth, rows=None):
+        self.width, self.depth = width, depth
+        self.rows = rows or [[0] * width for _ in range(depth)]
+
+    def cells(self, key):
+        # double hashing from one digest: row i uses (a + i*b) mod width
+        h = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        a, b = int.from_bytes(h[:8], "little"), int.from_bytes(h[8:], "little") | 1
+        return [(i, (a + i * b) % self.width) for i in range(self.depth)]
+
+    def add(self, key, n=1):
+        cells = self.cells(key)
+        for i, j in cells:
+            self.rows[i][j] += n
+        return min(self.rows[i][j] for i, j in cells)
+
+    def estimate(self, key):
+        return min(self.rows[i][j] for i, j in self.cells(key))
+
+def top_k(sketch, candidates, k):
+    """[{key, n}] of the k candidates with the highest estimates."""
+    est = sorted(((sketch.estimate(c), c) for c in candidates), key=lambda t: (-t[0], t[1]))
+    return [{"key": c, "n": n} for n, c in est[:k] if n > 0]
+
+class RepeatTracker:
+    """
+    Heavy hitters of id_client / num_cmd (count-min sketch + top-K) for repeat
+    contacts. Each process counts new tickets locally and a background thread
+    pushes its pending increments with $inc every REPEAT_FLUSH_INTERVAL
+    seconds; the shared sketch and top-K live in one document per identifier.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._state = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app, mongo):
+        self._mongo = mongo
+        self._dbname = app.config["MONGO_DBNAME"]
+        self.width = int(app.config.get("REPEAT_SKETCH_WIDTH", 2048))
+        self.depth = int(app.config.get("REPEAT_SKETCH_DEPTH", 4))
+        self.k = int(app.config.get("REPEAT_TOP_K", 50))
+        self.interval = float(app.config.get("REPEAT_FLUSH_INTERVAL", 30.0))
+        atexit.register(self.stop)
+
+    def _coll(self):
+        return self._mongo.cx.get_database(self._dbname)[SKETCHES]
+
+    def _entry(self, doc):
+        doc = doc or {}
+        sketch = CountMinSketch(doc.get("width", self.width), doc.get("depth", self.depth), doc.get("rows"))
+        return {"sketch": sketch, "top": [t["key"] for t in doc.get("top", [])],
+                "pending": {}, "seen": set(), "stored": bool(doc)}
+
+    def _load(self):
+        # per process (after the gunicorn fork), from the shared documents
+        if self._pid == os.getpid():
+            return
+        docs = {d["_id"]: d for d in self._coll().find({"_id": {"$in": list(REPEAT_DIMS)}})}
+        self._state = {dim: self._entry(docs.get(dim)) for dim in REPEAT_DIMS}
+        if not (self._thread and self._thread.is_alive()):
+            # started lazily so each gunicorn worker (post-fork) gets its own flusher
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="repeat-flusher", daemon=True)
+            self._thread.start()
+        self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def record(self, doc):
+        """Count one new ticket; returns {dim: estimated tickets} for its identifiers."""
+        out = {}
+        try:
+            with self._lock:
+                self._load()
+                for dim in REPEAT_DIMS:
+                    key = repeat_key(doc.get(dim))
+                    if not key:
+                        continue
+                    st = self._state[dim]
+                    for cell in st["sketch"].cells(key):
+                        st["pending"][cell] = st["pending"].get(cell, 0) + 1
+                    out[dim] = st["sketch"].add(key)
+                    st["seen"].add(key)
+        except Exception:
+            log.exception("repeat sketch update failed")
+        return out
+
+    def estimate(self, dim, value):
+        """Approximate tickets for one identifier (this process' view: last flush + own counts)."""
+        key = repeat_key(value)
+        if dim not in REPEAT_DIMS or not key:
+            return 0
+        with self._lock:
+            self._load()
+            return self._state[dim]["sketch"].estimate(key)
+
+    def flush(self):
+        """Push the pending increments, refresh the local sketch and the shared top-K."""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            work = {}
+            for dim, st in self._state.items():
+                if st["pending"]:
+                    work[dim] = (st["pending"], st["seen"])
+                    st["pending"], st["seen"] = {}, set()
+        for dim, (pending, seen) in work.items():
+            try:
+                self._push(dim, pending, seen)
+            except Exception:
+                log.exception("repeat sketch flush failed (%s), kept for the next one", dim)
+                with self._lock:
+                    st = self._state[dim]
+                    for cell, n in pending.items():
+                        st["pending"][cell] = st["pending"].get(cell, 0) + n
+                    st["seen"] |= seen
+
+    def stop(self):
+        """Stop the flusher and push what is pending (registered with atexit)."""
+        self._stop.set()
+        self.flush()
+
+    def _push(self, dim, pending, seen):
+        coll = self._coll()
+        st = self._state[dim]
+        if not st["stored"]:
+            sk = st["sketch"]
+            try:
+                coll.insert_one({"_id": dim, "width": sk.width, "depth": sk.depth,
+                                 "rows": [[0] * sk.width for _ in range(sk.depth)], "top": []})
+            except DuplicateKeyError:
+                pass  # another process created it first
+            st["stored"] = True
+        after = coll.find_one_and_update(
+            {"_id": dim},
+            {"$inc": {f"rows.{i}.{j}": n for (i, j), n in pending.items()}},
+            projection={"width": 1, "depth": 1, "rows": 1, "top": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        shared = CountMinSketch(after["width"], after["depth"], after["rows"])
+        top = top_k(shared, {t["key"] for t in after.get("top", [])} | seen, self.k)
+        coll.update_one({"_id": dim}, {"$set": {"top": top, "updated_at": datetime.now()}})
+        with self._lock:
+            # counts recorded while we were pushing are not in the shared rows yet
+            for (i, j), n in st["pending"].items():
+                shared.rows[i][j] += n
+            st["sketch"] = shared
+            st["top"] = [t["key"] for t in top]
+
+    def top(self, dim, limit=20):
+        """Shared top-K (all processes, as of their last flush)."""
+        doc = self._coll().find_one({"_id": dim}, {"top": 1, "updated_at": 1}) or {}
+        return doc.get("top", [])[:limit], doc.get("updated_at")
+
+    def rebuild(self, db, sources, echo=print):
+        """Recount every identifier from the ticket collections into fresh sketches."""
+        sketches = {dim: CountMinSketch(self.width, self.depth) for dim in REPEAT_DIMS}
+        tops = {dim: {} for dim in REPEAT_DIMS}  # bounded candidate set: key -> estimate
+        floors = dict.fromkeys(REPEAT_DIMS, 0)    # smallest candidate estimate, once full
+        n = 0
+        for src in sources:
+            for doc in db[src].find({}, {"_id": 0, **{dim: 1 for dim in REPEAT_DIMS}}):
+                n += 1
+                for dim in REPEAT_DIMS:
+                    key = repeat_key(doc.get(dim))
+                    if not key:
+                        continue
+                    est = sketches[dim].add(key)
+                    cand = tops[dim]
+                    if key in cand or len(cand) < 2 * self.k:
+                        cand[key] = est
+                    elif est > floors[dim]:
+                        del cand[min(cand, key=cand.get)]
+                        cand[key] = est
+                        floors[dim] = min(cand.values())
+                    if len(cand) == 2 * self.k and floors[dim] == 0:
+                        floors[dim] = min(cand.values())
+            echo(f"{src}: {n} tickets")
+        now = datetime.now()
+        for dim, sk in sketches.items():
+            db[SKETCHES].replace_one({"_id": dim}, {
+                "_id": dim, "width": sk.width, "depth": sk.depth, "rows": sk.rows,
+                "top": top_k(sk, tops[dim], self.k), "updated_at": now,
+            }, upsert=True)
+        with self._lock:
+            self._pid = None  # this process reloads on next use
+        return n
@@ -0,0 +1,290 @@
+"""
+Test de charge "agents du centre d'appel" : mélange réaliste de trafic sur l'application.
+
+Chaque agent virtuel se connecte (auth.login, "se souvenir de moi"), puis enchaîne,
+selon le mélange demandé, des listes avec recherche, des cascades de thématiques,
+des créations / éditions / clôtures de tickets et des rafraîchissements du dashboard.
+
+    # contre un serveur lancé (gunicorn) :
+    python loadtest.py --url http://127.0.0.1:8000 --user agent1 --password secret --agents 20
+    # dans le processus, via le client de test WSGI (MONGO_URI vers une base locale) :
+    python loadtest.py --wsgi --user agent1 --password secret --agents 10 --duration 30
+    # montée en charge jusqu'au dépassement du SLO :
+    python loadtest.py --url ... --ramp 5,10,20,40,80 --slo-p95 800 --slo-errors 1
+
+À lancer sur une base de test : les créations / éditions / clôtures sont réelles.
+"""
+import argparse, http.cookiejar, json, math, random, re, sys, threading, time, urllib.error, urllib.request
+from collections import defaultdict
+from urllib.parse import urlencode, quote
+
+DEFAULT_MIX = "list=30,thematiques=15,create=10,edit=8,close=5,analytics=10,login=2"
+SEARCH_TERMS = ["a", "cmd", "remb", "livraison", "casa", "10", "client"]
+ANALYTICS_APIS = ["by_bu", "by_agent", "by_canal", "by_thematique", "actions_montant", "total"]
+CASCADE = ["famille", "sous_famille", "categorie", "sous_categorie", "action"]
+
+_CSRF = re.compile(r'name="csrf_token" value="([^"]+)"')
+_VERSION = re.compile(r'name="version" value="(\d+)"')
+_EDIT_LINK = re.compile(r'/tickets/edit/([^"?/]+)"')
+
+# ---------- clients ----------
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # a 302 is a result to measure, not something to follow
+
+class HttpClient:
+    """Real HTTP against a running server (cookies kept per agent)."""
+
+    def __init__(self, base):
+        self.base = base.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, params=None, data=None, headers=None):
+        url = self.base + path + ("?" + urlencode(params) if params else "")
+        body = urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+        try:
+            with self.opener.open(req, timeout=60) as r:
+                return r.status, r.read().decode("utf-8", "replace"), r.headers.get("Location", "")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8", "replace"), e.headers.get("Location", "")
+
+class WsgiClient:
+    """In-process Flask test client (no server, same code path as the WSGI app)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, params=None, data=None, headers=None):
+        r = self.client.open(path, method=method, query_string=params, data=data, headers=headers)
+        return r.status_code, r.get_data(as_text=True), r.headers.get("Location", "")
+
+# ---------- mesures ----------
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)  # label -> [ms]
+        self.errors = defaultdict(int)
+
+    def record(self, label, ms, ok):
+        with self.lock:
+            self.latencies[label].append(ms)
+            if not ok:
+                self.errors[label] += 1
+
+    @staticmethod
+    def _pct(sorted_ms, p):
+        if not sorted_ms:
+            return 0.0
+        return sorted_ms[max(0, math.ceil(p / 100 * len(sorted_ms)) - 1)]  # nearest rank
+
+    def summary(self, seconds):
+        rows = []
+        for label in sorted(self.latencies):
+            ms = sorted(self.latencies[label])
+            rows.append({
+                "label": label, "n": len(ms), "rps": len(ms) / seconds,
+                "err": 100.0 * self.errors[label] / len(ms),
+                "p50": self._pct(ms, 50), "p95": self._pct(ms, 95), "p99": self._pct(ms, 99),
+            })
+        allms = sorted(m for v in self.latencies.values() for m in v)
+        n = len(allms)
+        total = {"label": "TOTAL", "n": n, "rps": n / seconds,
+                 "err": 100.0 * sum(self.errors.values()) / n if n else 0.0,
+                 "p50": self._pct(allms, 50), "p95": self._pct(allms, 95), "p99": self._pct(allms, 99)}
+        return rows, total
+
+def print_summary(rows, total, out=sys.stdout):
+    head = f"{'endpoint':<32}{'req':>7}{'req/s':>8}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(head, file=out)
+    print("-" * len(head), file=out)
+    for r in rows + [total]:
+        print(f"{r['label']:<32}{r['n']:>7}{r['rps']:>8.1f}{r['err']:>7.1f}"
+              f"{r['p50']:>9.0f}{r['p95']:>9.0f}{r['p99']:>9.0f}", file=out)
+
+# ---------- agent virtuel ----------
+
+class Agent:
+    def __init__(self, new_client, creds, stats, mix, think_ms, seed):
+        self.new_client = new_client
+        self.creds = creds
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.ops, self.weights = zip(*mix.items())
+        self.think_ms = think_ms
+        self.ids = []        # ids vus dans les listes (cibles des éditions / clôtures)
+        self.taxonomies = [] # chemins complets thématique -> action
+        self.client = None
+        self.csrf = ""
+
+    def call(self, label, method, path, ok=(200,), **kw):
+        t0 = time.perf_counter()
+        try:
+            status, body, loc = self.client.request(method, path, **kw)
+        except Exception:
+            status, body, loc = 0, "", ""
+        ms = (time.perf_counter() - t0) * 1000
+        # renvoyé vers /login = session perdue, donc une erreur
+        good = status in ok and "/login" not in loc
+        self.stats.record(label, ms, good)
+        return status, body
+
+    def op_login(self):
+        self.client = self.new_client()
+        _, body = self.call("GET /login", "GET", "/login")
+        m = _CSRF.search(body)
+        self.csrf = m.group(1) if m else ""
+        user, password = self.rng.choice(self.creds)
+        self.call("POST /login", "POST", "/login", ok=(302,), data={
+            "username": user, "password": password, "remember": "on", "csrf_token": self.csrf})
+
+    def op_list(self):
+        params = self.rng.choice([{}, {"q": self.rng.choice(SEARCH_TERMS)}, {"statut": "Ouvert"}])
+        label = "GET /tickets/list?q" if "q" in params else "GET /tickets/list"
+        _, body = self.call(label, "GET", "/tickets/list", params=params)
+        found = _EDIT_LINK.findall(body)
+        if found:
+            self.ids = (self.ids + found)[-200:]
+
+    def op_thematiques(self):
+        status, body = self.call("GET api/thematiques", "GET", "/tickets/api/thematiques")
+        thems = _json(body) if status == 200 else []
+        if not thems:
+            return
+        path = {"thematique": self.rng.choice(thems)}
+        for level in CASCADE:
+            status, body = self.call("GET api/thematiques/children", "GET",
+                                     "/tickets/api/thematiques/children", params=dict(path))
+            values = (_json(body) or {}).get("values") if status == 200 else None
+            if not values:
+                return
+            path[level] = self.rng.choice(values)
+        self.taxonomies = (self.taxonomies + [path])[-20:]
+
+    def _ticket_form(self):
+        if not self.taxonomies:
+            self.op_thematiques()
+        taxo = self.rng.choice(self.taxonomies) if self.taxonomies else {
+            "thematique": "Test", **{k: "Test" for k in CASCADE}}
+        n = self.rng.randint(1, 10 ** 6)
+        return {
+            "csrf_token": self.csrf, "nom_prenom": f"Client test {n}", "id_client": str(n),
+            "num_cmd": f"CMD{n}", "canal": "Email", "statut": "Ouvert", "traitement": "Normal",
+            "mnt_rembour": str(self.rng.choice([0, 0, 50, 120])), "mnt_gestco": "0",
+            "commentaires": "charge", **taxo,
+        }
+
+    def op_create(self):
+        self.call("POST /tickets/create", "POST", "/tickets/create", ok=(302,), data=self._ticket_form())
+
+    def op_edit(self):
+        if not self.ids:
+            return self.op_list()
+        tid = self.rng.choice(self.ids)
+        status, body = self.call("GET /tickets/edit", "GET", f"/tickets/edit/{quote(tid)}")
+        m = _VERSION.search(body)
+        if status != 200 or not m:
+            return
+        form = {**self._ticket_form(), "version": m.group(1)}
+        self.call("POST /tickets/edit", "POST", f"/tickets/edit/{quote(tid)}", ok=(302,), data=form)
+
+    def op_close(self):
+        if not self.ids:
+            return self.op_list()
+        tid = self.ids.pop(self.rng.randrange(len(self.ids)))
+        self.call("POST /tickets/close", "POST", f"/tickets/close/{quote(tid)}", ok=(302,),
+                  data={"csrf_token": self.csrf})
+
+    def op_analytics(self):
+        self.call("GET analytics/filter_options", "GET", "/analytics/api/filter_options")
+        params = self.rng.choice([{}, {"canal": "Email"}, {"date_from": "2025-01-01"}])
+        for api in ANALYTICS_APIS:
+            self.call(f"GET analytics/{api}", "GET", f"/analytics/api/{api}", params=params)
+
+    def run(self, stop):
+        self.op_login()
+        while not stop.is_set():
+            op = self.rng.choices(self.ops, self.weights)[0]
+            getattr(self, f"op_{op}")()
+            if self.think_ms:
+                stop.wait(self.rng.expovariate(1000.0 / self.think_ms))
+
+def _json(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+# ---------- orchestration ----------
+
+def run_stage(new_client, creds, agents, seconds, mix, think_ms, seed):
+    stats, stop = Stats(), threading.Event()
+    threads = [threading.Thread(target=Agent(new_client, creds, stats, mix, think_ms, seed + i).run,
+                                args=(stop,), daemon=True) for i in range(agents)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    stop.wait(seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+    return stats.summary(time.perf_counter() - t0)
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        op, _, w = part.partition("=")
+        if not hasattr(Agent, f"op_{op.strip()}"):
+            raise SystemExit(f"opération inconnue dans --mix: {op}")
+        mix[op.strip()] = float(w or 1)
+    return mix
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="URL du serveur (gunicorn)")
+    target.add_argument("--wsgi", action="store_true", help="client de test WSGI dans ce processus")
+    p.add_argument("--user", action="append", required=True, help="identifiant (répétable)")
+    p.add_argument("--password", action="append", required=True, help="mot de passe (même ordre que --user)")
+    p.add_argument("--agents", type=int, default=10, help="agents simultanés (sans --ramp)")
+    p.add_argument("--ramp", help="paliers d'agents, ex. 5,10,20,40")
+    p.add_argument("--duration", type=float, default=60, help="secondes par palier")
+    p.add_argument("--think-ms", type=float, default=500, help="temps de réflexion moyen entre deux actions")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"poids des opérations (défaut: {DEFAULT_MIX})")
+    p.add_argument("--slo-p95", type=float, default=1000, help="SLO: p95 global maximal (ms)")
+    p.add_argument("--slo-errors", type=float, default=1.0, help="SLO: taux d'erreur maximal (%%)")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args(argv)
+
+    if len(args.user) != len(args.password):
+        p.error("autant de --password que de --user")
+    creds = list(zip(args.user, args.password))
+    mix = parse_mix(args.mix)
+
+    if args.wsgi:
+        from app import create_app
+        app = create_app()
+        new_client = lambda: WsgiClient(app)
+    else:
+        new_client = lambda: HttpClient(args.url)
+
+    stages = [int(x) for x in args.ramp.split(",")] if args.ramp else [args.agents]
+    supported = None
+    for n in stages:
+        print(f"\n=== {n} agents, {args.duration:.0f} s ===")
+        rows, total = run_stage(new_client, creds, n, args.duration, mix, args.think_ms, args.seed)
+        print_summary(rows, total)
+        breached = total["p95"] > args.slo_p95 or total["err"] > args.slo_errors
+        if breached:
+            print(f"SLO dépassé à {n} agents (p95 {total['p95']:.0f} ms, erreurs {total['err']:.1f} %)")
+            break
+        supported = n
+    if args.ramp:
+        print(f"\nCharge maximale tenue: {supported if supported is not None else 'aucun palier'} agents")
+    return 0 if supported is not None else 1
+
+if __name__ == "__main__":
+    sys.exit(main())